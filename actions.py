@@ -1,6 +1,7 @@
 from pygame import Rect
 from enum import Enum
 from typing import Optional
+from snapshot import StateWriter, StateReader
 
 
 class CollisionType(Enum):
@@ -26,6 +27,16 @@ class CollisionItem(object):
     def get_offset_y(self) -> int:
         return self.__offset[1]
 
+    def align(self, source: Rect, inverted: bool = False) -> Rect:
+        """
+        New rect for this item placed against the source rect.
+        When inverted the offset is mirrored horizontally.
+        """
+        offset_x = self.__offset[0]
+        if inverted:
+            offset_x = source.width - self.__rect.width - offset_x
+        return Rect(source.left + offset_x, source.top + self.__offset[1], self.__rect.width, self.__rect.height)
+
 
 class MoveAxis(object):
     '''
@@ -44,6 +55,10 @@ class Frame(object):
         self.__items = citems
         self.__cls = self.__get_item(CollisionType.CLS)
         self.__attack = self.__get_item(CollisionType.ATTACK)
+        self.__cls_index = citems.index(self.__cls) if self.__cls is not None else -1
+        """ Aligned rects of the last (position, inverted) asked for """
+        self.__aligned_key: tuple = None
+        self.__aligned: list = []
 
     def get_index(self) -> int:
         return self.__index
@@ -66,23 +81,28 @@ class Frame(object):
     def allow_vertical_move(self) -> bool:
         return self.__move.y
 
-    def align(self, source: Rect, inverted: bool = False) -> None:
+    def align(self, source: Rect, inverted: bool = False) -> list:
         """
-        Align all collision rects of frame.
-        The alignement is placed against the source rect, the Character.
-        It computes the new collision position when Character sprite is
-        facing the opposite side.
+        Collision rects of the frame placed against the source rect, the
+        Character, in item order. Computed on demand and cached for the
+        last position, so repeated queries in a tick cost a tuple compare.
+        The returned rects are shared, do not modify them.
         """
-        for cls in self.__items:
-            offset_x = cls.get_offset_x()
-            if inverted:
-                offset_x = source.width - cls.get_rect().width - cls.get_offset_x()
-            cls.get_rect().left = source.left + offset_x
-            cls.get_rect().top = source.top + cls.get_offset_y()
-
-    def receive(self, source: Rect, inverted: bool = False) -> None:
+        key = (source.left, source.top, source.width, inverted)
+        if key != self.__aligned_key:
+            self.__aligned = [item.align(source, inverted) for item in self.__items]
+            self.__aligned_key = key
+        return self.__aligned
+
+    def get_hitbox(self, source: Rect, inverted: bool = False) -> Optional[Rect]:
+        """ Aligned rect of the collision item, if the frame has one """
+        if self.__cls is None:
+            return None
+        return self.align(source, inverted)[self.__cls_index]
+
+    def receive(self, source: Rect, target: Rect, inverted: bool = False) -> None:
         """
-        Calculate and apply the new position for the source rect.
+        Move the source rect so that its collision rect lands on target.
         """
         cls: CollisionItem = self.get_collision_item()
         if cls is None:
@@ -90,8 +110,8 @@ class Frame(object):
         offset_x = cls.get_offset_x()
         if inverted:
             offset_x = (source.width - cls.get_rect().width - cls.get_offset_x())
-        source.left = cls.get_rect().left - offset_x
-        source.top = cls.get_rect().top - cls.get_offset_y()
+        source.left = target.left - offset_x
+        source.top = target.top - cls.get_offset_y()
 
     def __get_item(self, ctype: CollisionType) -> Optional[CollisionItem]:
         for item in self.__items:
@@ -155,9 +175,17 @@ class Action(object):
             return False
         return True
 
-    def align_frames(self, source: Rect, inverted: bool = False) -> None:
-        for f in self.frames:
-            f.align(source, inverted)
+    def save(self, writer: StateWriter) -> None:
+        writer.write('iiB', self.tick, self.index, self.completed)
+
+    def load(self, reader: StateReader) -> None:
+        self.tick, self.index, completed = reader.read('iiB')
+        self.completed = completed == 1
+        self.frame = self.frames[self.index]
+
+    def align(self, source: Rect, inverted: bool = False) -> list:
+        """ Collision rects of the current frame only, see `Frame.align` """
+        return self.frame.align(source, inverted)
 
     def __build_global_collisions(self) -> None:
         if len(self.data.get('attack')):
@@ -194,22 +222,3 @@ class Action(object):
         if 'move_y' in data:
             default.x = data.get('move_y')
         return default
-
-
-class Transition(object):
-    def __init__(self, source: Action = None):
-        self.__source = source
-
-    def to(self, dest: Action) -> Action:
-        if self.__source is None:
-            return dest
-        if dest is None:
-            return self.__source
-        if dest is not self.__source:
-            if self.__source.can_interrupt(dest.name) or self.__source.is_completed():
-                self.__source.reset()
-                return dest
-            else:
-                return self.__source
-        else:
-            return self.__source
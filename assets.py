@@ -0,0 +1,67 @@
+from __future__ import annotations
+import time
+from typing import TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+from pygame import image
+from graphics import SpriteSheet
+from tiled_parser import TiledParser, load_level
+if TYPE_CHECKING:
+    """ Importing `startup` installs its import hook, only main does that """
+    from startup import StartupTracer
+
+""" Sprite sheets decoded at startup """
+IMAGES = [
+    "resources/sprites/ship.png",
+    "resources/sprites/laser-bolts.png",
+    "resources/sprites/enemy-small.png",
+    "resources/sprites/explosion.png",
+    "resources/sprites/verifier_font_8x8.png",
+]
+
+""" Levels parsed at startup """
+LEVELS = [
+    "resources/levels/level1.json",
+]
+
+
+class AssetLoader(object):
+    """
+    Decodes independent PNGs and parses level files on a thread pool.
+    Decoding does not need a display, so it can overlap `pygame.init` and
+    window creation. `install` waits for the results and hands them to
+    `SpriteSheet` and `TiledParser`; the display dependent `convert_alpha`
+    stays on the main thread, where the factories slice the sheets.
+    """
+    def __init__(self, images: list = IMAGES, levels: list = LEVELS, workers: int = 4,
+                 tracer: StartupTracer = None):
+        self.images = images
+        self.levels = levels
+        self.workers = workers
+        self.tracer = tracer
+        self.__pool: ThreadPoolExecutor = None
+        self.__images: dict = {}
+        self.__levels: dict = {}
+
+    def start(self) -> None:
+        self.__pool = ThreadPoolExecutor(self.workers, thread_name_prefix='assets')
+        for filename in self.images:
+            self.__images[filename] = self.__pool.submit(self.__timed, image.load, filename)
+        for filename in self.levels:
+            self.__levels[filename] = self.__pool.submit(self.__timed, load_level, filename)
+
+    def install(self) -> None:
+        if self.__pool is None:
+            self.start()
+        for filename, future in self.__images.items():
+            SpriteSheet.cache[filename] = future.result()
+        for filename, future in self.__levels.items():
+            TiledParser.cache[filename] = future.result()
+        self.__pool.shutdown()
+        self.__pool = None
+
+    def __timed(self, load, filename: str) -> object:
+        started = time.perf_counter()
+        result = load(filename)
+        if self.tracer is not None:
+            self.tracer.record('asset', filename, started, time.perf_counter() - started)
+        return result
@@ -0,0 +1,18 @@
+from pygame.sprite import Sprite
+
+
+def collide_hitbox_mask(left: Sprite, right: Sprite) -> bool:
+    """
+    Collision callback for `spritecollide` and `groupcollide`.
+    Sprites provide `get_hitbox()` and a precomputed `mask`.
+    The cheap rect and hitbox tests run first, the pixel overlap of the
+    masks only for pairs that pass both.
+    """
+    if not left.rect.colliderect(right.rect):
+        return False
+    a = left.get_hitbox()
+    b = right.get_hitbox()
+    if a is None or b is None or not a.colliderect(b):
+        return False
+    offset = (right.rect.left - left.rect.left, right.rect.top - left.rect.top)
+    return left.mask.overlap(right.mask, offset) is not None
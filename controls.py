@@ -264,6 +264,33 @@ class Keyboard(Input):
         return UserInput(self.direction, self.buttons)
 
 
+class AiController(Input):
+    """
+    Input driven by code instead of a device.
+    Agents, replays and network peers write into `user_input` directly.
+    """
+    def __init__(self):
+        self.user_input = AiInput()
+
+    def key_down(self, e: Event) -> None:
+        pass
+
+    def key_up(self, e: Event) -> None:
+        pass
+
+    def on_event(self) -> None:
+        pass
+
+    def get_direction(self) -> Direction:
+        return self.user_input.direction
+
+    def get_buttons(self) -> Buttons:
+        return self.user_input.button
+
+    def get_user_input(self) -> UserInput:
+        return self.user_input
+
+
 class Controller(Input):
 
     def __init__(self):
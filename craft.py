@@ -1,11 +1,13 @@
 from pygame import Surface, Rect
 from pygame.sprite import Sprite, Group
-from graphics import ImageFactory, SpriteSheet
+from graphics import ImageFactory, SpriteSheet, build_masks
+from pygame.mask import Mask
 from controls import UserInput, State, Direction, Buttons
-from actions import Action, Transition
+from actions import Action
+from fsm import StateMachine
 from pygame.math import Vector2
 from typing import Optional
-from itertools import cycle
+from snapshot import StateWriter, StateReader
 
 
 def actions() -> dict:
@@ -103,6 +105,13 @@ class CraftState(object):
     def get_speed(self) -> int:
         return 4
 
+    """ Compiled once for all crafts """
+    machine: StateMachine = None
+
+    def __init__(self):
+        if CraftState.machine is None:
+            CraftState.machine = StateMachine(self.get_transitions(), self.get_redirects())
+
     def get_transitions(self) -> dict:
         return {
             self.FLY: [self.LEFT, self.RIGHT, self.DEAD],
@@ -113,27 +122,21 @@ class CraftState(object):
             self.DEAD: [self.FLY]
         }
 
-    def to(self, current: str, new: str, action: Action) -> str:
-        transitions = self.get_transitions()
-        if current in transitions:
-            if new in transitions[current]:
-                if action.can_interrupt(new):
-                    return new
-                elif action.is_completed():
-                    return new
-            if new is CraftState.FLY and current in [CraftState.LEFT, CraftState.RIGHT]:
-                if current is CraftState.LEFT:
-                    return CraftState.LEFT_RESTORE
-                else:
-                    return CraftState.RIGHT_RESTORE
-            if new in [CraftState.RIGHT, CraftState.LEFT] and \
-                    current in [CraftState.LEFT_RESTORE, CraftState.RIGHT_RESTORE]:
-                return CraftState.FLY
-            if new is CraftState.LEFT and current is CraftState.RIGHT:
-                return CraftState.RIGHT_RESTORE
-            if new is CraftState.RIGHT and current is CraftState.LEFT:
-                return CraftState.LEFT_RESTORE
-        return current
+    def get_redirects(self) -> dict:
+        """ Turning and releasing go through the restore animations """
+        return {
+            (self.LEFT, self.FLY): self.LEFT_RESTORE,
+            (self.RIGHT, self.FLY): self.RIGHT_RESTORE,
+            (self.LEFT_RESTORE, self.LEFT): self.FLY,
+            (self.LEFT_RESTORE, self.RIGHT): self.FLY,
+            (self.RIGHT_RESTORE, self.LEFT): self.FLY,
+            (self.RIGHT_RESTORE, self.RIGHT): self.FLY,
+            (self.RIGHT, self.LEFT): self.RIGHT_RESTORE,
+            (self.LEFT, self.RIGHT): self.LEFT_RESTORE
+        }
+
+    def to(self, action: Action, new: str) -> str:
+        return self.machine.to(action, new)
 
 
 class CraftImageFactory(ImageFactory):
@@ -143,6 +146,7 @@ class CraftImageFactory(ImageFactory):
         self.sheet = SpriteSheet(self.FILENAME)
         self.images = []
         self.create()
+        self.masks = build_masks(self.images)
 
     def create(self) -> None:
         width = 16
@@ -161,6 +165,12 @@ class CraftImageFactory(ImageFactory):
     def get_image(self, index: int) -> Surface:
         return self.images[index]
 
+    def get_mask(self, index: int) -> Mask:
+        return self.masks[index]
+
+    def get_images(self) -> list:
+        return self.images
+
 
 class BoltImageFactory(ImageFactory):
     FILENAME = "resources/sprites/laser-bolts.png"
@@ -169,6 +179,7 @@ class BoltImageFactory(ImageFactory):
         self.sheet = SpriteSheet(self.FILENAME)
         self.images = []
         self.create()
+        self.masks = build_masks(self.images)
 
     def create(self) -> None:
         self.images.append(self.sheet.get_image(6, 18, 5, 13))
@@ -177,21 +188,40 @@ class BoltImageFactory(ImageFactory):
     def get_image(self, index: int) -> Surface:
         return self.images[index]
 
+    def get_mask(self, index: int) -> Mask:
+        return self.masks[index]
+
+    def get_images(self) -> list:
+        return self.images
+
 
 class Bolt(Sprite):
     def __init__(self, rect: Rect, image_factory: ImageFactory, *groups: tuple):
         super().__init__(groups)
         self.__image_factory = image_factory
         self.rect = rect
-        self.__image_index = cycle([0, 1])
+        self.__image_index = 0
         self.__speed = -5
 
     def update(self, time: int) -> None:
         self.rect.top += self.__speed
-        self.image = self.__image_factory.get_image(next(self.__image_index))
+        self.image = self.__image_factory.get_image(self.__image_index)
+        self.mask = self.__image_factory.get_mask(self.__image_index)
+        self.__image_index ^= 1
         if self.rect.top < 0:
             self.kill()
 
+    def get_hitbox(self) -> Rect:
+        return self.rect
+
+    def save(self, writer: StateWriter) -> None:
+        writer.write('iiB', self.rect.left, self.rect.top, self.__image_index)
+
+    def load(self, reader: StateReader) -> None:
+        self.rect.left, self.rect.top, self.__image_index = reader.read('iiB')
+        self.image = self.__image_factory.get_image(self.__image_index ^ 1)
+        self.mask = self.__image_factory.get_mask(self.__image_index ^ 1)
+
 
 class CraftControl(object):
     def __init__(self):
@@ -329,16 +359,25 @@ class Craft(Sprite):
         self.bolts.update(time)
 
     def __apply_action(self, action: str) -> None:
-        action = self.__state.to(self.__action.name, action, self.__action)
-        new_action: Action = self.__actions.get(action)
-        self.__action = Transition(self.__action).to(new_action)
+        name = self.__state.to(self.__action, action)
+        if name != self.__action.name:
+            self.__action.reset()
+            self.__action = self.__actions.get(name)
         self.__action.next()
+        self.__update_image()
+
+    def __update_image(self) -> None:
+        index = self.__action.frame.get_index()
+        self.mask = self.__image_factory.get_mask(index)
         if self.is_invincible():
-            img = self.__image_factory.get_image(self.__action.frame.get_index()).copy()
+            img = self.__image_factory.get_image(index).copy()
             img.set_alpha(80)
             self.image = img
         else:
-            self.image = self.__image_factory.get_image(self.__action.frame.get_index())
+            self.image = self.__image_factory.get_image(index)
+
+    def get_hitbox(self) -> Optional[Rect]:
+        return self.__action.frame.get_hitbox(self.rect)
 
     def __invincibility(self, time: int) -> None:
         if self.is_invincible():
@@ -359,6 +398,43 @@ class Craft(Sprite):
         self.__action = self.__actions.get(CraftState.DEAD)
         self.__image_factory = self.__explosion_image_factory
 
+    def save(self, writer: StateWriter) -> None:
+        names = list(self.__actions)
+        states = list(State)
+        last = self.__control.last_pressed
+        writer.write('iidiiBiBb',
+                     self.rect.left, self.rect.top, self.__vel.x,
+                     self.__points, self.__lifes,
+                     self.__invincible, self.__invincible_counter,
+                     names.index(self.__action.name),
+                     -1 if last is None else states.index(last))
+        for action in self.__actions.values():
+            action.save(writer)
+        writer.write('H', len(self.bolts))
+        for bolt in self.bolts:
+            bolt.save(writer)
+
+    def load(self, reader: StateReader) -> None:
+        left, top, self.__vel.x, self.__points, self.__lifes, invincible, \
+            self.__invincible_counter, action, last = reader.read('iidiiBiBb')
+        self.rect.topleft = (left, top)
+        self.__invincible = invincible == 1
+        self.__control.last_pressed = None if last < 0 else list(State)[last]
+        for item in self.__actions.values():
+            item.load(reader)
+        self.__action = self.__actions.get(list(self.__actions)[action])
+        if self.__action.name is CraftState.DEAD:
+            self.__image_factory = self.__explosion_image_factory
+        else:
+            self.__image_factory = self.__craft_image_factory
+        self.__update_image()
+        self.bolts.empty()
+        count, = reader.read('H')
+        for i in range(count):
+            bolt = Bolt(Rect(0, 0, 5, 13), self.__bolt_factory)
+            bolt.load(reader)
+            self.bolts.add(bolt)
+
 
 def factory(expl: ImageFactory, pos: Rect) -> Craft:
     acts: dict = {}
@@ -0,0 +1,66 @@
+from pygame import Rect
+
+
+class Culler(object):
+    """
+    Decides what is worth drawing, animating and keeping.
+    The view is the screen grown by `margin` on every side, so sprites
+    entering the screen are ready a few pixels ahead. Projectiles are
+    despawned as soon as they leave the play area. Counters accumulate
+    until `reset_stats`.
+    """
+    def __init__(self, margin: int = 16):
+        self.margin = margin
+        self.view = Rect(0, 0, 0, 0)
+        self.play_area = Rect(0, 0, 0, 0)
+        self.__frames = 0
+        self.__tested = 0
+        self.__culled = 0
+        self.__despawned = 0
+        self.__skipped = 0
+
+    def set_view(self, screen: Rect) -> None:
+        self.view = screen.inflate(self.margin * 2, self.margin * 2)
+
+    def set_play_area(self, area: Rect) -> None:
+        self.play_area = area
+
+    def visible(self, sprites: object) -> list:
+        """ (image, rect) pairs of the sprites inside the view """
+        view = self.view
+        items = [(sprite.image, sprite.rect) for sprite in sprites if view.colliderect(sprite.rect)]
+        self.__tested += len(sprites)
+        self.__culled += len(sprites) - len(items)
+        return items
+
+    def animate(self, sprites: object) -> None:
+        """ Sprites outside the view skip their animation ticks """
+        view = self.view
+        for sprite in sprites:
+            sprite.animate = view.colliderect(sprite.rect)
+            self.__skipped += not sprite.animate
+
+    def despawn(self, group: object) -> int:
+        """ Kill the sprites of `group` that left the play area """
+        area = self.play_area
+        gone = [sprite for sprite in group if not area.colliderect(sprite.rect)]
+        for sprite in gone:
+            sprite.kill()
+        self.__despawned += len(gone)
+        return len(gone)
+
+    def next_frame(self) -> None:
+        self.__frames += 1
+
+    def stats(self) -> dict:
+        return {
+            'frames': self.__frames,
+            'tested': self.__tested,
+            'culled': self.__culled,
+            'cull_rate': self.__culled / self.__tested if self.__tested else 0.0,
+            'despawned': self.__despawned,
+            'animation_skipped': self.__skipped
+        }
+
+    def reset_stats(self) -> None:
+        self.__frames = self.__tested = self.__culled = self.__despawned = self.__skipped = 0
@@ -1,12 +1,17 @@
-from graphics import ImageFactory, SpriteSheet
+from graphics import ImageFactory, SpriteSheet, FlippedImageFactory, build_masks
+from pygame.mask import Mask
 from pygame.sprite import Sprite, Group, spritecollide
 from pygame.math import Vector2
-from pygame.transform import flip
 from pygame import Rect, Surface
 from actions import Action
-from enemy_behaviour import HomeBehaviour, Behaviour, DiveBehaviour
-from itertools import cycle
-from random import randint
+from fsm import StateMachine
+from enemy_behaviour import HomeBehaviour, Behaviour, DiveBehaviour, ReturnBehaviour, DrivenBehaviour, \
+    load_behaviour
+from random import Random
+from rng import RandomService
+from snapshot import StateWriter, StateReader
+from collision import collide_hitbox_mask
+from typing import Optional
 
 
 def actions() -> dict:
@@ -38,6 +43,47 @@ def actions() -> dict:
     }
 
 
+class IndexedSet(object):
+    """
+    Set with O(1) add, remove and access by position.
+    Removal moves the last item into the gap, so order is not insertion order.
+    """
+    def __init__(self):
+        self.__items: list = []
+        self.__positions: dict = {}
+
+    def add(self, item: object) -> None:
+        if item in self.__positions:
+            return
+        self.__positions[item] = len(self.__items)
+        self.__items.append(item)
+
+    def remove(self, item: object) -> None:
+        position = self.__positions.pop(item, None)
+        if position is None:
+            return
+        last = self.__items.pop()
+        if last is not item:
+            self.__items[position] = last
+            self.__positions[last] = position
+
+    def clear(self) -> None:
+        self.__items.clear()
+        self.__positions.clear()
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def __getitem__(self, position: int) -> object:
+        return self.__items[position]
+
+    def __iter__(self):
+        return iter(self.__items)
+
+    def __contains__(self, item: object) -> bool:
+        return item in self.__positions
+
+
 class EnemyBulletFactory(ImageFactory):
     FILENAME = "resources/sprites/laser-bolts.png"
 
@@ -45,6 +91,7 @@ class EnemyBulletFactory(ImageFactory):
         self.sheet = SpriteSheet(self.FILENAME)
         self.images = []
         self.create()
+        self.masks = build_masks(self.images)
 
     def create(self) -> None:
         self.images.append(self.sheet.get_image(6, 7, 5, 5))
@@ -53,20 +100,37 @@ class EnemyBulletFactory(ImageFactory):
     def get_image(self, index: int) -> Surface:
         return self.images[index]
 
+    def get_mask(self, index: int) -> Mask:
+        return self.masks[index]
+
+    def get_images(self) -> list:
+        return self.images
+
 
 class EnemyBullet(Sprite):
     def __init__(self, rect: Rect, image_factory: ImageFactory, *groups: tuple):
         super().__init__(groups)
         self.__image_factory = image_factory
         self.rect = rect
-        self.__image_index = cycle([0, 1])
+        self.__image_index = 0
         self.__speed = 2
 
     def update(self, time: int) -> None:
         self.rect.top += self.__speed
-        self.image = self.__image_factory.get_image(next(self.__image_index))
-        if self.rect.top > 300:
-            self.kill()
+        self.image = self.__image_factory.get_image(self.__image_index)
+        self.mask = self.__image_factory.get_mask(self.__image_index)
+        self.__image_index ^= 1
+
+    def get_hitbox(self) -> Rect:
+        return self.rect
+
+    def save(self, writer: StateWriter) -> None:
+        writer.write('iiB', self.rect.left, self.rect.top, self.__image_index)
+
+    def load(self, reader: StateReader) -> None:
+        self.rect.left, self.rect.top, self.__image_index = reader.read('iiB')
+        self.image = self.__image_factory.get_image(self.__image_index ^ 1)
+        self.mask = self.__image_factory.get_mask(self.__image_index ^ 1)
 
 
 class EnemyImageFactory(ImageFactory):
@@ -76,6 +140,7 @@ class EnemyImageFactory(ImageFactory):
         self.sheet = SpriteSheet(self.FILENAME)
         self.images = []
         self.create()
+        self.masks = build_masks(self.images)
 
     def create(self) -> None:
         width = 16
@@ -94,10 +159,17 @@ class EnemyImageFactory(ImageFactory):
     def get_image(self, index: int) -> Surface:
         return self.images[index]
 
+    def get_mask(self, index: int) -> Mask:
+        return self.masks[index]
+
+    def get_images(self) -> list:
+        return self.images
+
 
 class Enemy(Sprite):
     FLY = 'fly'
     EXPLODE = 'explode'
+    machine = StateMachine({FLY: [EXPLODE]})
 
     def __init__(self,
                  initial_pos: Rect,
@@ -106,34 +178,82 @@ class Enemy(Sprite):
                  explosion_image_factory: ImageFactory,
                  bullet_factory: ImageFactory,
                  bullets_group: Group,
+                 flipped_image_factory: ImageFactory,
+                 flipped_explosion_image_factory: ImageFactory,
+                 rng: Random,
                  *groups: tuple):
         super().__init__(groups)
         self.points = 50
         self.__actions = actions
-        self.__image_factory = image_factory
-        self.__explosion_image_factory = explosion_image_factory
+        """ Pairs of (upright, flipped) factories, flipped is used when moving up """
+        self.__enemy_image_factories = (image_factory, flipped_image_factory)
+        self.__explosion_image_factories = (explosion_image_factory, flipped_explosion_image_factory)
+        self.__image_factories = self.__enemy_image_factories
         self.initial = (initial_pos.left, initial_pos.top)
         self.rect = initial_pos
         self.__action: Action = self.__actions.get(self.FLY)
         self.__vel: Vector2 = Vector2(0, 0)
         self.__bullet_factory = bullet_factory
         self.bullets = bullets_group
-        self.behaviour = HomeBehaviour((0, -20), (initial_pos[0], initial_pos[1]))
+        """ Steering stream, shared by every behaviour of this enemy """
+        self.__rng = rng
+        self.behaviour = HomeBehaviour((0, -20), (initial_pos[0], initial_pos[1]), rng)
+        self.__listener = None
+        """ Cleared by the group on frames this enemy skips its animation """
+        self.animate = True
 
     def update(self, time: int) -> None:
         self.__move(time)
         if self.__action.name is self.EXPLODE and self.__action.is_completed():
             self.kill()
-        self.__action.next()
-        self.image = self.__image_factory.get_image(self.__action.frame.get_index())
-        if self.__vel.y < 0:
-            self.image = flip(self.image, False, True)
+            self.__changed()
+        if self.animate:
+            self.__action.next()
+        self.__update_image()
+
+    def set_listener(self, listener) -> None:
+        """ Called with the enemy whenever its behaviour, action or liveness changes """
+        self.__listener = listener
+
+    def is_exploding(self) -> bool:
+        return self.__action.name is self.EXPLODE
+
+    def save(self, writer: StateWriter) -> None:
+        writer.write('iiddB', self.rect.left, self.rect.top, self.__vel.x, self.__vel.y,
+                     self.__action.name == self.EXPLODE)
+        for action in self.__actions.values():
+            action.save(writer)
+        self.behaviour.save(writer)
+
+    def load(self, reader: StateReader) -> None:
+        self.rect.left, self.rect.top, vx, vy, explode = reader.read('iiddB')
+        self.__vel.update(vx, vy)
+        for action in self.__actions.values():
+            action.load(reader)
+        self.behaviour = load_behaviour(reader, self.__rng)
+        if explode:
+            self.__action = self.__actions.get(self.EXPLODE)
+            self.__image_factories = self.__explosion_image_factories
+        else:
+            self.__action = self.__actions.get(self.FLY)
+            self.__image_factories = self.__enemy_image_factories
+        self.__update_image()
+
+    def get_hitbox(self) -> Optional[Rect]:
+        return self.__action.frame.get_hitbox(self.rect)
+
+    def __update_image(self) -> None:
+        factory = self.__image_factories[1 if self.__vel.y < 0 else 0]
+        index = self.__action.frame.get_index()
+        self.image = factory.get_image(index)
+        self.mask = factory.get_mask(index)
 
     def in_home(self) -> bool:
         return isinstance(self.behaviour, HomeBehaviour)
 
     def set_behaviour(self, behaviour: Behaviour) -> None:
         self.behaviour = behaviour
+        self.__changed()
 
     def get_behaviour(self) -> Behaviour:
         return self.behaviour
@@ -145,11 +265,12 @@ class Enemy(Sprite):
         self.bullets.add(bullet)
 
     def destroy(self, actor: Sprite) -> None:
-        if self.__action.name == self.EXPLODE:
+        if self.machine.to(self.__action, self.EXPLODE) == self.__action.name:
             return
         actor.add_points(self.points)
         self.__action = self.__actions.get(self.EXPLODE)
-        self.__image_factory = self.__explosion_image_factory
+        self.__image_factories = self.__explosion_image_factories
+        self.__changed()
 
     def __move(self, time: int) -> None:
         if self.__action.name is self.EXPLODE:
@@ -158,29 +279,101 @@ class Enemy(Sprite):
         self.__vel = self.behaviour.steer.vel
         self.rect.center = self.behaviour.steer.pos
         if self.behaviour.is_completed():
-            self.behaviour = self.behaviour.next()
+            behaviour = self.behaviour.next()
+            if behaviour is not self.behaviour:
+                self.behaviour = behaviour
+                self.__changed()
+
+    def __changed(self) -> None:
+        if self.__listener is not None:
+            self.__listener(self)
 
 
 class EnemyGroup(object):
     DIVE_TIME = 4000
     SHOOT_TIME = 1000
 
-    def __init__(self, pos: list, expl: ImageFactory):
+    def __init__(self, pos: list, expl: ImageFactory, rng: RandomService):
+        """ Dive and shoot decisions come from the AI stream """
+        self.__rng = rng.get(RandomService.AI)
         image_factory = EnemyImageFactory()
-        bullet_factory = EnemyBulletFactory()
+        flipped = FlippedImageFactory(image_factory)
+        flipped_expl = FlippedImageFactory(expl)
+        self.__bullet_factory = EnemyBulletFactory()
         self.__bullet_group = Group()
         self.__enemies = Group()
+        """ Every enemy of the wave, alive or not, in creation order """
+        self.__all: list = []
+        """ Formation membership, kept up to date by enemy notifications """
+        self.__home = IndexedSet()
+        self.__diving = IndexedSet()
+        self.__returning = IndexedSet()
+        self.__exploding = IndexedSet()
+        self.__formation = {
+            HomeBehaviour.KIND: self.__home,
+            DiveBehaviour.KIND: self.__diving,
+            ReturnBehaviour.KIND: self.__returning
+        }
+        self.__placement: dict = {}
         self.__shoot_counter = 0
         self.__dive_counter = 0
+        self.__animation_skip = 1
+        self.__ticks = 0
+        self.__culler = None
+        self.__swarm = None
         for rect in pos:
-            self.__enemies.add(enemy_factory(self.__bullet_group, expl, image_factory, bullet_factory, rect))
+            enemy = enemy_factory(self.__bullet_group, expl, image_factory, self.__bullet_factory, rect,
+                                  flipped, flipped_expl, rng.get(RandomService.STEERING))
+            self.__all.append(enemy)
+            self.__enemies.add(enemy)
+            enemy.set_listener(self.__place)
+            self.__place(enemy)
 
     def update(self, time: int) -> None:
-        self.__enemies.update(time)
-        self.__dive(time)
-        self.__shoot(time)
+        if self.__animation_skip > 1:
+            self.__ticks += 1
+            animate = self.__ticks % self.__animation_skip == 0
+            for enemy in self.__home:
+                enemy.animate = animate
+        if self.__culler is not None:
+            self.__culler.animate(self.__diving)
+            self.__culler.animate(self.__returning)
+        if self.__swarm is not None:
+            shooters = self.__drive(time)
+            self.__enemies.update(time)
+            """ Bullets start from the positions of this tick """
+            for enemy in shooters:
+                enemy.shoot()
+        else:
+            self.__enemies.update(time)
+            self.__dive(time)
+            self.__shoot(time)
         self.__bullet_group.update(time)
 
+    def set_swarm(self, swarm: object) -> None:
+        """
+        Let a started `SwarmClient` simulate behaviours, dives and shots.
+        Enemies get `DrivenBehaviour`s, so snapshots are not available.
+        """
+        self.__swarm = swarm
+        for enemy in self.__all:
+            enemy.set_behaviour(DrivenBehaviour(enemy.get_behaviour().KIND, enemy.get_behaviour().steer.pos))
+
+    def close(self) -> None:
+        if self.__swarm is not None:
+            self.__swarm.close()
+            self.__swarm = None
+
+    def set_culler(self, culler: object) -> None:
+        """ Diving and returning enemies outside the culler's view skip animation """
+        self.__culler = culler
+
+    def set_animation_skip(self, skip: int) -> None:
+        """ Enemies waiting in formation advance their animation every `skip` frames """
+        self.__animation_skip = skip
+        for enemy in self.__all:
+            enemy.animate = True
+
     def draw(self, surface: Surface) -> None:
         self.__enemies.draw(surface)
         self.__bullet_group.draw(surface)
@@ -188,54 +381,156 @@ class EnemyGroup(object):
     def hit_actor(self, actor: Sprite) -> None:
         if not actor.is_alive():
             return
-        bullets = spritecollide(actor, self.__bullet_group, True)
+        bullets = spritecollide(actor, self.__bullet_group, True, collide_hitbox_mask)
         if len(bullets) > 0 and not actor.is_invincible():
             actor.destroy()
 
     def sprites(self) -> Group:
         return self.__enemies
 
+    def bullets(self) -> Group:
+        return self.__bullet_group
+
+    def save(self, writer: StateWriter) -> None:
+        if self.__swarm is not None:
+            raise RuntimeError("A swarm driven group can not be saved.")
+        indexes = {enemy: i for i, enemy in enumerate(self.__all)}
+        alive = [indexes[enemy] for enemy in self.__enemies]
+        writer.write('iiIH', self.__shoot_counter, self.__dive_counter, self.__ticks, len(alive))
+        writer.write('%dH' % len(alive), *alive)
+        for enemy in self.__all:
+            enemy.save(writer)
+        """ Sampling picks by position, so membership order is state too """
+        for members in self.__get_sets():
+            writer.write('H', len(members))
+            writer.write('%dH' % len(members), *[indexes[enemy] for enemy in members])
+        writer.write('H', len(self.__bullet_group))
+        for bullet in self.__bullet_group:
+            bullet.save(writer)
+
+    def load(self, reader: StateReader) -> None:
+        self.__shoot_counter, self.__dive_counter, self.__ticks, count = reader.read('iiIH')
+        alive = reader.read('%dH' % count)
+        for enemy in self.__all:
+            enemy.load(reader)
+            """ Skipped animation is decided each update, a frozen flag would outlive the restore """
+            enemy.animate = True
+        self.__enemies.empty()
+        self.__enemies.add(*[self.__all[i] for i in alive])
+        self.__placement.clear()
+        for members in self.__get_sets():
+            members.clear()
+            count, = reader.read('H')
+            for i in reader.read('%dH' % count):
+                members.add(self.__all[i])
+                self.__placement[self.__all[i]] = members
+        self.__bullet_group.empty()
+        count, = reader.read('H')
+        for i in range(count):
+            bullet = EnemyBullet(Rect(0, 0, 5, 5), self.__bullet_factory)
+            bullet.load(reader)
+            self.__bullet_group.add(bullet)
+
     def count(self) -> int:
-        return len(self.__enemies.sprites())
+        return len(self.__enemies)
+
+    def get_initial(self) -> list:
+        """ Formation slots in creation order """
+        return [enemy.initial for enemy in self.__all]
 
     def get_home_sprites(self) -> list:
-        return list(filter(lambda e: e.in_home() is True, self.__enemies.sprites()))
+        return list(self.__home)
 
     def get_dive_sprites(self) -> list:
-        return list(filter(lambda e: e.in_home() is False, self.__enemies.sprites()))
+        return list(self.__diving) + list(self.__returning)
+
+    def __get_sets(self) -> tuple:
+        return (self.__home, self.__diving, self.__returning, self.__exploding)
+
+    def __place(self, enemy: Enemy) -> None:
+        """ Only enemies in formation skip animation frames """
+        enemy.animate = True
+        current = self.__placement.pop(enemy, None)
+        if current is not None:
+            current.remove(enemy)
+        if not enemy.alive():
+            return
+        if enemy.is_exploding():
+            members = self.__exploding
+        else:
+            members = self.__formation[enemy.get_behaviour().KIND]
+        members.add(enemy)
+        self.__placement[enemy] = members
+
+    def __drive(self, time: int) -> list:
+        """
+        Sync point: hand this frame's kills to the worker, wait for the tick
+        and move the enemies to its positions. The worker then moves the
+        next tick while this frame carries on. Returns the enemies to shoot.
+        """
+        swarm = self.__swarm
+        alive = [enemy.alive() and not enemy.is_exploding() for enemy in self.__all]
+        swarm.alive[:] = alive
+        swarm.submit(time)
+        state, kinds, shots = swarm.sync()
+        state = state.tolist()
+        kinds = kinds.tolist()
+        shots = shots.tolist()
+        swarm.advance()
+        shooters: list = []
+        for enemy, flag, kind, row, shot in zip(self.__all, alive, kinds, state, shots):
+            if not flag:
+                continue
+            behaviour = enemy.get_behaviour()
+            if behaviour.KIND != kind:
+                behaviour = DrivenBehaviour(kind, behaviour.steer.pos)
+                enemy.set_behaviour(behaviour)
+            behaviour.steer.pos.update(row[0], row[1])
+            behaviour.steer.vel.update(row[2], row[3])
+            if shot:
+                shooters.append(enemy)
+        return shooters
 
     def __dive(self, time: int) -> None:
-        if len(self.get_home_sprites()) == 0:
+        home = self.__home
+        if len(home) == 0:
             return
         self.__dive_counter += time
         if self.__dive_counter > self.DIVE_TIME:
             self.__dive_counter = 0
-            indexes = [randint(0, len(self.get_home_sprites()) - 1) for i in range(2)]
-            for i, enemy in enumerate(self.get_home_sprites()):
-                if i in indexes:
-                    b = enemy.get_behaviour()
-                    target = (randint(32, 368), 330)
-                    n = DiveBehaviour(b.steer.pos, target, enemy.initial)
-                    enemy.set_behaviour(n)
+            """ Pick first, diving moves enemies out of `home` """
+            chosen = [home[i] for i in {self.__rng.randint(0, len(home) - 1) for i in range(2)}]
+            for enemy in chosen:
+                b = enemy.get_behaviour()
+                target = (self.__rng.randint(32, 368), 330)
+                n = DiveBehaviour(b.steer.pos, target, enemy.initial, b.steer.rng)
+                enemy.set_behaviour(n)
 
     def __shoot(self, time: int) -> None:
-        if len(self.get_dive_sprites()) == 0:
+        diving = self.__diving
+        returning = self.__returning
+        total = len(diving) + len(returning)
+        if total == 0:
             return
         self.__shoot_counter += time
         if self.__shoot_counter > self.SHOOT_TIME:
             self.__shoot_counter = 0
-            indexes = [randint(0, len(self.get_dive_sprites()) - 1) for i in range(4)]
-            for i, enemy in enumerate(self.get_dive_sprites()):
-                if i in indexes:
-                    enemy.shoot()
+            for i in {self.__rng.randint(0, total - 1) for i in range(4)}:
+                if i < len(diving):
+                    diving[i].shoot()
+                else:
+                    returning[i - len(diving)].shoot()
 
 
 def enemy_factory(bullet_group: Group,
                   expl: ImageFactory,
                   img: ImageFactory,
                   bullet_factory: ImageFactory,
-                  rect: Rect) -> Enemy:
+                  rect: Rect,
+                  flipped_img: ImageFactory,
+                  flipped_expl: ImageFactory,
+                  rng: Random) -> Enemy:
     acts: dict = {}
     for name, data in actions().items():
         acts[name] = (Action(name, data, rect))
-    return Enemy(rect, acts, img, expl, bullet_factory, bullet_group)
+    return Enemy(rect, acts, img, expl, bullet_factory, bullet_group, flipped_img, flipped_expl, rng)
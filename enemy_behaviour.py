@@ -1,5 +1,6 @@
-from random import uniform
+from random import Random
 from pygame.math import Vector2
+from snapshot import StateWriter, StateReader
 
 
 def bresenham(x0, y0, x1, y1):
@@ -36,6 +37,8 @@ def bresenham(x0, y0, x1, y1):
 
 
 class Behaviour(object):
+    KIND = 0
+
     def __init__(self):
         raise RuntimeError("Can not instatiate `Behaviour`")
 
@@ -48,10 +51,16 @@ class Behaviour(object):
     def update(self, time: int) -> bool:
         raise NotImplementedError("Implement `update` method.")
 
+    def save(self, writer: StateWriter) -> None:
+        writer.write('Bddii', self.KIND, self.source[0], self.source[1], self.target[0], self.target[1])
+        self.steer.save(writer)
+
 
 class HomeBehaviour(Behaviour):
-    def __init__(self, source: tuple, target: tuple):
-        self.steer = EnemySteer(source)
+    KIND = 1
+
+    def __init__(self, source: tuple, target: tuple, rng: Random):
+        self.steer = EnemySteer(source, rng)
         self.source = source
         self.target = target
 
@@ -66,8 +75,10 @@ class HomeBehaviour(Behaviour):
 
 
 class ReturnBehaviour(Behaviour):
-    def __init__(self, source: tuple, target: tuple):
-        self.steer = EnemySteer(source)
+    KIND = 2
+
+    def __init__(self, source: tuple, target: tuple, rng: Random):
+        self.steer = EnemySteer(source, rng)
         self.source = source
         self.target = target
 
@@ -76,15 +87,17 @@ class ReturnBehaviour(Behaviour):
         # return self.steer.pos == self.target
 
     def next(self) -> Behaviour:
-        return HomeBehaviour(self.steer.pos, self.target)
+        return HomeBehaviour(self.steer.pos, self.target, self.steer.rng)
 
     def update(self, time: int) -> None:
         self.steer.update(self.target)
 
 
 class DiveBehaviour(Behaviour):
-    def __init__(self, source: tuple, target: tuple, home: tuple):
-        self.steer = EnemySteer(source)
+    KIND = 3
+
+    def __init__(self, source: tuple, target: tuple, home: tuple, rng: Random):
+        self.steer = EnemySteer(source, rng)
         self.source = source
         self.target = target
         self.home = home
@@ -93,20 +106,56 @@ class DiveBehaviour(Behaviour):
         return self.steer.desired.length() < 0.5
 
     def next(self) -> Behaviour:
-        return ReturnBehaviour(self.steer.pos, self.home)
+        return ReturnBehaviour(self.steer.pos, self.home, self.steer.rng)
 
     def update(self, time: int) -> None:
         self.steer.update(self.target)
 
+    def save(self, writer: StateWriter) -> None:
+        writer.write('Bddiiii', self.KIND, self.source[0], self.source[1],
+                     self.target[0], self.target[1], self.home[0], self.home[1])
+        self.steer.save(writer)
 
-class EnemySteer(object):
+
+class DrivenSteer(object):
+    """ Position and velocity written from outside, see `DrivenBehaviour` """
     def __init__(self, pos: tuple):
+        self.pos = Vector2(pos[0], pos[1])
+        self.vel = Vector2(0, 0)
+
+
+class DrivenBehaviour(Behaviour):
+    """
+    Stand-in for a behaviour simulated elsewhere, e.g. by the swarm worker.
+    Only its kind is known; the owner writes `steer` every tick.
+    """
+    def __init__(self, kind: int, pos: tuple):
+        self.KIND = kind
+        self.steer = DrivenSteer(pos)
+
+    def is_completed(self) -> bool:
+        return False
+
+    def next(self) -> Behaviour:
+        return self
+
+    def update(self, time: int) -> None:
+        pass
+
+    def save(self, writer: StateWriter) -> None:
+        raise RuntimeError("Driven behaviours can not be saved.")
+
+
+class EnemySteer(object):
+    """ `rng` is the steering stream of the game's `RandomService` """
+    def __init__(self, pos: tuple, rng: Random):
+        self.rng = rng
         self.desired = None
         self.max_speed = 5
         self.max_force = 0.1
         self.approach_radius = 30
         self.pos = Vector2(pos[0], pos[1])
-        self.vel = Vector2(self.max_speed, 0).rotate(uniform(0, 360))
+        self.vel = Vector2(self.max_speed, 0).rotate(rng.uniform(0, 360))
         self.acc = Vector2(0, 0)
         self.dist = 0
 
@@ -124,6 +173,19 @@ class EnemySteer(object):
         self.dist = dist
         return steer
 
+    def save(self, writer: StateWriter) -> None:
+        desired = self.desired or Vector2(0, 0)
+        writer.write('ddddddBddd',
+                     self.pos.x, self.pos.y, self.vel.x, self.vel.y, self.acc.x, self.acc.y,
+                     self.desired is not None, desired.x, desired.y, self.dist)
+
+    def load(self, reader: StateReader) -> None:
+        px, py, vx, vy, ax, ay, has_desired, dx, dy, self.dist = reader.read('ddddddBddd')
+        self.pos.update(px, py)
+        self.vel.update(vx, vy)
+        self.acc.update(ax, ay)
+        self.desired = Vector2(dx, dy) if has_desired else None
+
     def update(self, target: tuple):
         self.acc = self.seek_with_approach(target)
         # equations of motion
@@ -131,3 +193,21 @@ class EnemySteer(object):
         if self.vel.length() > self.max_speed:
             self.vel.scale_to_length(self.max_speed)
         self.pos += self.vel
+
+
+def load_behaviour(reader: StateReader, rng: Random) -> Behaviour:
+    """
+    Rebuild a behaviour written by `Behaviour.save`.
+    """
+    kind, sx, sy, tx, ty = reader.read('Bddii')
+    if kind == DiveBehaviour.KIND:
+        hx, hy = reader.read('ii')
+        behaviour = DiveBehaviour((sx, sy), (tx, ty), (hx, hy), rng)
+    elif kind == ReturnBehaviour.KIND:
+        behaviour = ReturnBehaviour((sx, sy), (tx, ty), rng)
+    elif kind == HomeBehaviour.KIND:
+        behaviour = HomeBehaviour((sx, sy), (tx, ty), rng)
+    else:
+        raise ValueError("Unknown behaviour kind %d." % kind)
+    behaviour.steer.load(reader)
+    return behaviour
@@ -0,0 +1,191 @@
+from __future__ import annotations
+import numpy
+from pygame import Rect, display, HIDDEN
+from controls import AiController, State
+from game import Game, PlayGameState
+from rng import RandomService
+
+
+""" Simulated milliseconds per step, the frame time of `App.FPS` """
+FRAME_TIME = 33
+
+"""
+Discrete action space as (direction x, fire).
+Fire presses `State.A`; the craft only shoots again after a release.
+"""
+ACTIONS = (
+    (0, 0),
+    (-1, 0),
+    (1, 0),
+    (0, 1),
+    (-1, 1),
+    (1, 1),
+)
+ACTION_X = numpy.array([a[0] for a in ACTIONS], dtype=numpy.int8)
+ACTION_FIRE = numpy.array([a[1] for a in ACTIONS], dtype=numpy.int8)
+
+
+def ensure_display() -> None:
+    """
+    Image factories call `convert_alpha`, which needs a display mode.
+    Open a hidden one when running without a window.
+    """
+    if display.get_surface() is None:
+        display.set_mode((1, 1), HIDDEN)
+
+
+class GalagaEnv(object):
+    """
+    Headless environment around `PlayGameState`.
+    Actions are indexes into `ACTIONS` and are fed through an `AiController`.
+    Observations are a flat float32 vector:
+        craft:   x, y, alive, invincible, lifes
+        enemies: MAX_ENEMIES slots of alive, x, y, diving
+        bullets: MAX_BULLETS slots of x, y
+        bolts:   MAX_BOLTS slots of x, y
+    """
+    MAX_ENEMIES = 32
+    MAX_BULLETS = 16
+    MAX_BOLTS = 3
+    CRAFT_SIZE = 5
+    ENEMY_SIZE = 4
+    OBS_SIZE = CRAFT_SIZE + MAX_ENEMIES * ENEMY_SIZE + MAX_BULLETS * 2 + MAX_BOLTS * 2
+    DEATH_PENALTY = -100
+
+    def __init__(self, max_steps: int = 5000, obs: numpy.ndarray = None):
+        ensure_display()
+        self.max_steps = max_steps
+        self.screen = Rect(0, 0, Game.SCREEN_WIDTH, Game.SCREEN_HEIGHT)
+        self.input = AiController()
+        self.state: PlayGameState = None
+        """ Own streams, unseeded episodes continue where the last one stopped """
+        self.rng = RandomService()
+        """ Observation buffer, may be a row of a batched array """
+        self.obs = obs if obs is not None else numpy.zeros(self.OBS_SIZE, dtype=numpy.float32)
+        self.__row: list = [0.0] * self.OBS_SIZE
+        self.__enemies: list = []
+        self.__steps = 0
+        self.__points = 0
+        self.__alive = True
+
+    def reset(self, seed: int = None) -> numpy.ndarray:
+        if seed is not None:
+            self.rng.seed(seed)
+        self.input.user_input.direction.update(0, 0)
+        self.input.user_input.button.reset()
+        self.state = PlayGameState(self.screen, self.rng)
+        """ Enemies keep the same observation slot for the whole episode """
+        self.__enemies = list(self.state.enemies.sprites())[:self.MAX_ENEMIES]
+        self.__steps = 0
+        self.__points = 0
+        self.__alive = True
+        self.__observe()
+        return self.obs
+
+    def step(self, action: int) -> tuple:
+        x, fire = ACTIONS[action]
+        reward, done = self.advance(x, fire)
+        return self.obs, reward, done
+
+    def advance(self, x: int, fire: int) -> tuple:
+        """
+        Run one frame with already decoded input.
+        Returns (reward, done) and refreshes `obs` in place.
+        """
+        user_input = self.input.user_input
+        user_input.direction.update(x, 0)
+        if fire:
+            user_input.button.pressed(State.A)
+        else:
+            user_input.button.released(State.A)
+        self.state.update(FRAME_TIME, self.input)
+        self.__steps += 1
+
+        actor = self.state.actor
+        points = actor.get_points()
+        reward = points - self.__points
+        self.__points = points
+        alive = actor.is_alive()
+        if self.__alive and not alive:
+            reward += self.DEATH_PENALTY
+        self.__alive = alive
+
+        done = (actor.is_dead() and actor.get_lifes() == 0) \
+            or self.state.enemies.count() == 0 \
+            or self.__steps >= self.max_steps
+        self.__observe()
+        return reward, done
+
+    def __observe(self) -> None:
+        row = self.__row
+        actor = self.state.actor
+        row[0] = actor.rect.centerx
+        row[1] = actor.rect.centery
+        row[2] = 1.0 if actor.is_alive() else 0.0
+        row[3] = 1.0 if actor.is_invincible() else 0.0
+        row[4] = actor.get_lifes()
+        i = self.CRAFT_SIZE
+        for enemy in self.__enemies:
+            if enemy.alive():
+                row[i] = 1.0
+                row[i + 1] = enemy.rect.centerx
+                row[i + 2] = enemy.rect.centery
+                row[i + 3] = 0.0 if enemy.in_home() else 1.0
+            else:
+                row[i] = row[i + 1] = row[i + 2] = row[i + 3] = 0.0
+            i += self.ENEMY_SIZE
+        i = self.__fill(row, self.CRAFT_SIZE + self.MAX_ENEMIES * self.ENEMY_SIZE,
+                        self.state.enemies.bullets(), self.MAX_BULLETS)
+        self.__fill(row, i, actor.bolts, self.MAX_BOLTS)
+        """ Single conversion into the numpy buffer """
+        self.obs[:] = row
+
+    def __fill(self, row: list, start: int, group: object, slots: int) -> int:
+        i = start
+        end = start + slots * 2
+        for sprite in group:
+            if i >= end:
+                break
+            row[i] = sprite.rect.centerx
+            row[i + 1] = sprite.rect.centery
+            i += 2
+        while i < end:
+            row[i] = row[i + 1] = 0.0
+            i += 2
+        return end
+
+
+class VectorEnv(object):
+    """
+    Steps `count` environments in lockstep in one process.
+    Every env writes into its own row of the batched arrays, so no stacking
+    happens per step. Returned arrays are reused and overwritten on the
+    next call; copy them to keep history.
+    Finished envs are reset automatically and report their first observation.
+    """
+    def __init__(self, count: int, max_steps: int = 5000):
+        self.count = count
+        self.observations = numpy.zeros((count, GalagaEnv.OBS_SIZE), dtype=numpy.float32)
+        self.rewards = numpy.zeros(count, dtype=numpy.float32)
+        self.dones = numpy.zeros(count, dtype=numpy.bool_)
+        self.envs = [GalagaEnv(max_steps, self.observations[i]) for i in range(count)]
+
+    def reset(self, seed: int = None) -> numpy.ndarray:
+        for i, env in enumerate(self.envs):
+            env.reset(None if seed is None else seed + i)
+        return self.observations
+
+    def step(self, actions: numpy.ndarray) -> tuple:
+        """ Decode the whole batch once, then run each env without lookups """
+        actions = numpy.asarray(actions)
+        xs = ACTION_X[actions].tolist()
+        fires = ACTION_FIRE[actions].tolist()
+        rewards = self.rewards
+        dones = self.dones
+        for i, env in enumerate(self.envs):
+            reward, done = env.advance(xs[i], fires[i])
+            rewards[i] = reward
+            dones[i] = done
+            if done:
+                env.reset()
+        return self.observations, rewards, dones
@@ -43,6 +43,18 @@ class FontFactory(object):
             '9': 25
         }
 
+    def render(self, text: str, surface: Surface, pos: tuple) -> None:
+        """
+        Blit text straight into surface. Glyphs follow ASCII from space,
+        so digits, upper case letters and common punctuation are available.
+        """
+        x, y = pos
+        for char in text:
+            glyph = ord(char) - 32
+            if 0 <= glyph < len(self.__factory.images):
+                surface.blit(self.__factory.get_image(glyph), (x, y))
+            x += 8
+
     def get_number(self, num: int) -> Surface:
         self.__image = Surface([64, 8], SRCALPHA).convert_alpha()
         word = str(num)
@@ -0,0 +1,76 @@
+from actions import Action
+
+
+class StateMachine(object):
+    """
+    Finite state machine compiled from declarations into flat integer tables.
+
+    `transitions` maps a state to the states it may move to directly.
+    `redirects` maps (current, requested) to the state entered instead when
+    the request is not taken directly, e.g. a restore animation.
+    Either move only happens when the current action can be interrupted
+    by the new state or has completed, otherwise the state is kept.
+
+    Compile once per entity type and share it between instances.
+    """
+    def __init__(self, transitions: dict, redirects: dict = None):
+        redirects = redirects or {}
+        self.names: list = []
+        self.__index: dict = {}
+        for state, targets in transitions.items():
+            self.__add(state)
+            for target in targets:
+                self.__add(target)
+        for (current, requested), target in redirects.items():
+            self.__add(current)
+            self.__add(requested)
+            self.__add(target)
+        size = len(self.names)
+        self.__size = size
+        self.__direct = [-1] * (size * size)
+        self.__redirect = [-1] * (size * size)
+        self.__counts = [0] * (size * size)
+        for state, targets in transitions.items():
+            for target in targets:
+                self.__direct[self.__cell(state, target)] = self.__index[target]
+        for (current, requested), target in redirects.items():
+            self.__redirect[self.__cell(current, requested)] = self.__index[target]
+
+    def to(self, action: Action, requested: str) -> str:
+        """ Name of the state to be in after `requested` is asked for """
+        current = self.__index[action.name]
+        new = self.__index.get(requested)
+        if new is None:
+            return action.name
+        cell = current * self.__size + new
+        target = self.__direct[cell]
+        if target < 0 or not self.__can_leave(action, target):
+            target = self.__redirect[cell]
+            if target >= 0 and not self.__can_leave(action, target):
+                target = -1
+        if target < 0:
+            target = current
+        self.__counts[current * self.__size + target] += 1
+        return self.names[target]
+
+    def get_counts(self) -> dict:
+        """ Resolved transitions as {(from, to): count}, self loops included """
+        counts = {}
+        for cell, count in enumerate(self.__counts):
+            if count:
+                counts[(self.names[cell // self.__size], self.names[cell % self.__size])] = count
+        return counts
+
+    def reset_counts(self) -> None:
+        self.__counts = [0] * (self.__size * self.__size)
+
+    def __can_leave(self, action: Action, target: int) -> bool:
+        return action.can_interrupt(self.names[target]) or action.is_completed()
+
+    def __add(self, state: str) -> None:
+        if state not in self.__index:
+            self.__index[state] = len(self.names)
+            self.names.append(state)
+
+    def __cell(self, current: str, requested: str) -> int:
+        return self.__index[current] * len(self.names) + self.__index[requested]
@@ -2,25 +2,34 @@ from __future__ import annotations
 from controls import Input
 from pygame import Rect, Surface, draw, mouse
 from pygame.sprite import Group, groupcollide
-from graphics import Graphics, ImageFactory, SpriteSheet
+from graphics import Graphics, ImageFactory, SpriteSheet, RenderQueue, StaticLayerRenderer, TileImageFactory, \
+    build_masks
+from pygame.mask import Mask
+from collision import collide_hitbox_mask
+from culling import Culler
+from swarm import SwarmClient
 from tiled_parser import TiledParser
 import craft
 import enemies
-import random
 from font import FontFactory
+from hud import Hud, TextWidget, NumberWidget
+from snapshot import StateWriter, StateReader
+from rng import RandomService
+from governor import Quality
 
 
 class Game(object):
     SCREEN_WIDTH = 320
     SCREEN_HEIGHT = 255
 
-    def __init__(self, input: Input):
-        self.graphics = Graphics(self.SCREEN_WIDTH, self.SCREEN_HEIGHT)
+    def __init__(self, input: Input, seed: int = None, vsync: bool = False, swarm: bool = False,
+                 pipelined: bool = False):
+        self.graphics = Graphics(self.SCREEN_WIDTH, self.SCREEN_HEIGHT, vsync=vsync, pipelined=pipelined)
         screen_rect = Rect(0, 0, self.SCREEN_WIDTH, self.SCREEN_HEIGHT)
         mouse.set_visible(0)
         self.input = input
         self.__debug = False
-        self.state = PlayGameState(screen_rect)
+        self.state = PlayGameState(screen_rect, RandomService(seed), swarm)
 
     def update(self, time: int) -> None:
         """ Get the next state of the game """
@@ -29,9 +38,31 @@ class Game(object):
         self.state.update(time, self.input)
 
     def render(self) -> None:
+        self.draw()
+        self.present()
+
+    def draw(self) -> None:
+        """ Compose the frame in the low resolution back buffer """
         self.state.render(self.graphics.get_surface())
+
+    def present(self) -> None:
+        """ Scale the back buffer to the window and flip """
         self.graphics.render()
 
+    def get_metrics(self) -> tuple:
+        return self.state.get_metrics()
+
+    def get_cull_stats(self) -> dict:
+        return self.state.get_cull_stats()
+
+    def close(self) -> None:
+        self.state.close()
+        self.graphics.close()
+
+    def set_quality(self, quality: Quality) -> None:
+        self.graphics.set_scaler(quality.scaler)
+        self.state.set_quality(quality)
+
     def toggle_debug(self) -> None:
         self.state.toggle_debug()
 
@@ -43,6 +74,7 @@ class ExplosionImageFactory(ImageFactory):
         self.sheet = SpriteSheet(self.FILENAME)
         self.images = []
         self.create()
+        self.masks = build_masks(self.images)
 
     def create(self) -> None:
         width = 16
@@ -61,6 +93,12 @@ class ExplosionImageFactory(ImageFactory):
     def get_image(self, index: int) -> Surface:
         return self.images[index]
 
+    def get_mask(self, index: int) -> Mask:
+        return self.masks[index]
+
+    def get_images(self) -> list:
+        return self.images
+
 
 class GameState(object):
     def __init__(self):
@@ -75,15 +113,34 @@ class GameState(object):
     def get_state(self) -> GameState:
         raise NotImplementedError("Implement `get_state` method.")
 
+    def get_metrics(self) -> tuple:
+        """ (level, drawn sprites, enemies, enemy bullets) for telemetry """
+        return ('', 0, 0, 0)
+
+    def set_quality(self, quality: Quality) -> None:
+        pass
+
+    def get_cull_stats(self) -> dict:
+        return {}
+
+    def close(self) -> None:
+        """ Release workers and shared memory """
+        pass
+
 
 class PlayGameState(GameState):
-    def __init__(self, screen: Rect):
+    LEVEL = 'resources/levels/level1.json'
+
+    def __init__(self, screen: Rect, rng: RandomService = None, swarm: bool = False):
+        """ `swarm` moves the enemy simulation to a worker process """
         self.screen = screen
+        self.rng = rng if rng is not None else RandomService()
+        self.__stars_rng = self.rng.get(RandomService.STARS)
         self.actor = None
         self.group = Group()
         self.enemies = None
         self.background: Surface = None
-        self.map = TiledParser('resources/levels/level1.json').get_map()
+        self.map = TiledParser(self.LEVEL).get_map()
         self.map.set_screen(screen)
         self.limits: list = []
         for platform in self.map.get_platforms():
@@ -93,26 +150,43 @@ class PlayGameState(GameState):
                 self.right = platform.get_rect()
             self.limits.append(platform.get_rect())
         self.__stars: list = []
+        """ Stars drawn, the first ones of `__stars` """
+        self.__star_count = 200
         self.__explosion_image_factory = ExplosionImageFactory()
+        self.__static = StaticLayerRenderer(
+            self.map.get_static_layers(), TileImageFactory(), self.map.get_rect().size)
         self.__respawn_counter = 0
         self.__load_background()
         self.__load_actor()
-        self.__load_enemies()
+        self.__load_enemies(swarm)
         self.__font = FontFactory()
+        self.__load_hud()
+        self.culler = Culler()
+        self.culler.set_view(self.map.get_screen())
+        self.culler.set_play_area(Rect(self.left.right, 0, self.right.left - self.left.right, self.screen.h))
+        self.enemies.set_culler(self.culler)
+        self.__sprites = RenderQueue()
+        self.__sprites.add(self.group, 0)
+        self.__sprites.add(self.enemies.sprites(), 1)
+        self.__sprites.add(self.enemies.bullets(), 2)
+        self.__sprites.add(self.actor.bolts, 2)
 
     def update(self, time: int, input: Input) -> None:
+        self.culler.set_view(self.map.get_screen())
+        self.culler.next_frame()
         self.__update_actor(time, input)
         self.__update_enemies(time)
+        """ Projectiles go as soon as they leave the play area """
+        self.culler.despawn(self.enemies.bullets())
+        self.culler.despawn(self.actor.bolts)
 
     def render(self, surface: Surface) -> None:
         surface.fill((21, 21, 21))
         self.__blit_background(surface)
-        self.group.draw(surface)
-        self.enemies.draw(surface)
-        self.actor.bolts.draw(surface)
-        surface.blit(self.__font.get_number(self.actor.get_points()), (168, 0))
-        # Info panel
-        surface.fill((41, 41, 41), self.left)
+        self.__static.draw(surface, self.map.get_screen())
+        self.__sprites.draw(surface, self.culler)
+        # Info panel and score
+        self.__hud.draw(surface)
 
     def get_state(self) -> GameState:
         return self
@@ -120,24 +194,85 @@ class PlayGameState(GameState):
     def toggle_debug(self) -> None:
         pass
 
+    def get_cull_stats(self) -> dict:
+        return self.culler.stats()
+
+    def close(self) -> None:
+        self.enemies.close()
+
+    def set_quality(self, quality: Quality) -> None:
+        self.__star_count = quality.stars
+        self.enemies.set_animation_skip(quality.animation_skip)
+
+    def get_metrics(self) -> tuple:
+        return (self.LEVEL, self.__sprites.get_count(), self.enemies.count(), len(self.enemies.bullets()))
+
+    def save_state(self) -> bytes:
+        """
+        Pack the running wave, including the RNG, into a binary snapshot.
+        """
+        writer = StateWriter()
+        writer.write('iB', self.__respawn_counter, self.actor.alive())
+        self.actor.save(writer)
+        self.enemies.save(writer)
+        stars: list = []
+        for star in self.__stars:
+            stars.extend((star[0], star[1]))
+            stars.extend(star[2])
+        writer.write('H', len(self.__stars))
+        writer.write('id3B' * len(self.__stars), *stars)
+        self.rng.save(writer)
+        return writer.getvalue()
+
+    def load_state(self, data: bytes) -> None:
+        """
+        Restore a snapshot taken by `save_state` on the same level.
+        """
+        reader = StateReader(data)
+        self.__respawn_counter, in_group = reader.read('iB')
+        self.actor.load(reader)
+        if in_group:
+            self.group.add(self.actor)
+        else:
+            self.group.remove(self.actor)
+        self.enemies.load(reader)
+        count, = reader.read('H')
+        values = reader.read('id3B' * count)
+        self.__stars = [
+            [values[i], values[i + 1], values[i + 2:i + 5]] for i in range(0, len(values), 5)
+        ]
+        self.rng.load(reader)
+
     def __load_actor(self) -> None:
         pos = self.map.get_actor().get_items_index(0).get_rect()
         self.actor = craft.factory(self.__explosion_image_factory, pos)
         self.group.add(self.actor)
 
-    def __load_enemies(self) -> None:
+    def __load_enemies(self, swarm: bool) -> None:
         rects: list = []
         enem = self.map.get_enemies()[0]
         for rect in enem.get_items():
             rects.append(rect.get_rect())
-        self.enemies = enemies.EnemyGroup(rects, self.__explosion_image_factory)
+        self.enemies = enemies.EnemyGroup(rects, self.__explosion_image_factory, self.rng)
+        if swarm:
+            client = SwarmClient(self.enemies.get_initial(), self.rng.seed_value)
+            client.start()
+            self.enemies.set_swarm(client)
+
+    def __load_hud(self) -> None:
+        self.__hud = Hud(self.left, (41, 41, 41))
+        self.__hud.add(NumberWidget(Rect(168, 0, 64, 8), self.actor.get_points, self.__font))
+        lives = Rect(self.left.left + 4, self.left.top + 16, self.left.width - 8, 8)
+        self.__hud.add(TextWidget(lives, lambda: 'LIVES', self.__font))
+        self.__hud.add(NumberWidget(lives.move(0, 10), self.actor.get_lifes, self.__font, 1))
 
     def __load_background(self) -> None:
         colors = [(255, 255, 255), (255, 0, 0), (0, 0, 255)]
-        for x in range(200):
-            random.shuffle(colors)
+        rng = self.__stars_rng
+        for x in range(self.__star_count):
+            rng.shuffle(colors)
             self.__stars.append(
-                [random.randint(self.left.w, self.right.left), random.randint(0, self.screen.h), colors[0]]
+                [rng.randint(self.left.w, self.right.left), rng.randint(0, self.screen.h), colors[0]]
             )
 
     def __update_actor(self, time, input: Input) -> None:
@@ -152,19 +287,20 @@ class PlayGameState(GameState):
                 else:
                     self.actor.rect.right = limit.left
         """ Destroy enemies when collide with actor's bolts """
-        [enemy.destroy(self.actor) for enemy in groupcollide(self.enemies.sprites(), self.actor.bolts, False, True)]
+        [enemy.destroy(self.actor) for enemy in groupcollide(
+            self.enemies.sprites(), self.actor.bolts, False, True, collide_hitbox_mask)]
 
     def __update_enemies(self, time: int) -> None:
         self.enemies.update(time)
         self.enemies.hit_actor(self.actor)
 
     def __blit_background(self, surface: Surface) -> None:
-        for star in self.__stars:
+        for star in self.__stars[:self.__star_count]:
             draw.line(surface, star[2], (star[0], star[1]), (star[0], star[1]))
             star[1] = star[1] + 0.5
             if star[1] > self.screen.h:
                 star[1] = 0
-                star[0] = random.randint(self.left.w, self.right.left)
+                star[0] = self.__stars_rng.randint(self.left.w, self.right.left)
 
     def __respawn_actor(self, time: int) -> None:
         if self.actor.can_respawn():
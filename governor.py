@@ -0,0 +1,84 @@
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class Quality(object):
+    """
+    One rung of the quality ladder.
+    `stars` background stars are drawn, `scaler` names a `Graphics` scaler
+    and home enemies advance their animation every `animation_skip` frames.
+    """
+    def __init__(self, name: str, stars: int, scaler: str, animation_skip: int):
+        self.name = name
+        self.stars = stars
+        self.scaler = scaler
+        self.animation_skip = animation_skip
+
+
+""" Best first, each rung is cheaper than the one before """
+LADDER = [
+    Quality('full', 200, 'nearest', 1),
+    Quality('fewer stars', 120, 'nearest', 1),
+    Quality('idle animation', 120, 'nearest', 2),
+    Quality('sparse stars', 60, 'nearest', 3),
+    Quality('interlaced', 60, 'interlaced', 3),
+]
+
+
+class QualityGovernor(object):
+    """
+    Moves along the ladder from the time frames take to update, render and
+    present, sleeping excluded.
+    Every `window` frames the 90th percentile is compared with the budget:
+    above `high` of it the next cheaper rung is applied at once, below `low`
+    of it for `recover` windows in a row the previous rung is restored.
+    The gap between both keeps the governor from flapping.
+    """
+    def __init__(self, budget: float, apply, ladder: list = LADDER, window: int = 30,
+                 high: float = 0.85, low: float = 0.5, recover: int = 3):
+        self.budget = budget
+        self.ladder = ladder
+        self.window = window
+        self.high = high
+        self.low = low
+        self.recover = recover
+        self.__apply = apply
+        self.__times: deque = deque(maxlen=window)
+        self.__frames = 0
+        self.__calm = 0
+        self.__level = 0
+        """ (frame, from, to, p90 ms) of every change """
+        self.changes: list = []
+        apply(ladder[0])
+
+    def get_quality(self) -> Quality:
+        return self.ladder[self.__level]
+
+    def record(self, work_ms: float) -> None:
+        self.__times.append(work_ms)
+        self.__frames += 1
+        if self.__frames % self.window != 0:
+            return
+        p90 = sorted(self.__times)[int(len(self.__times) * 0.9) - 1]
+        if p90 > self.budget * self.high:
+            self.__calm = 0
+            if self.__level < len(self.ladder) - 1:
+                self.__set(self.__level + 1, p90)
+        elif p90 < self.budget * self.low:
+            self.__calm += 1
+            if self.__calm >= self.recover and self.__level > 0:
+                self.__calm = 0
+                self.__set(self.__level - 1, p90)
+        else:
+            self.__calm = 0
+
+    def __set(self, level: int, p90: float) -> None:
+        previous = self.ladder[self.__level]
+        self.__level = level
+        quality = self.ladder[level]
+        self.changes.append((self.__frames, previous.name, quality.name, p90))
+        logger.info('frame %d: quality %s -> %s, p90 %.2f ms of %.2f ms',
+                    self.__frames, previous.name, quality.name, p90, self.budget)
+        self.__apply(quality)
@@ -1,34 +1,219 @@
-from pygame import Surface, Rect, gfxdraw, SRCALPHA, image, HWSURFACE, DOUBLEBUF, FULLSCREEN
+import queue
+import threading
+import time
+from collections import OrderedDict
+from pygame import Surface, Rect, gfxdraw, SRCALPHA, image, HWSURFACE, DOUBLEBUF, FULLSCREEN, SCALED, error
 from pygame.sprite import Sprite
-from pygame.transform import scale
+from pygame.transform import scale, flip
+from pygame.mask import Mask, from_surface
 from pygame.display import set_mode, update
 
 
+def flips_block(count: int = 6, period: float = 3.0) -> bool:
+    """
+    Whether display flips wait for the vertical blank. SDL falls back to a
+    software renderer that ignores vsync without raising, so a few flips
+    are timed: blocking ones are a refresh apart, at least `period` ms on
+    displays up to 333 Hz.
+    """
+    update()
+    last = time.perf_counter()
+    shortest = period
+    for i in range(count):
+        update()
+        now = time.perf_counter()
+        shortest = min(shortest, (now - last) * 1000)
+        last = now
+    return shortest >= period
+
+
+class Presenter(object):
+    """
+    Presents frames on its own thread, scaling and flipping release the GIL.
+    `submit` hands over the finished back buffer and returns a free one to
+    draw the next frame into. At most one frame waits to be presented, so
+    the main thread is never more than one frame ahead; `waited` sums the
+    seconds it blocked for a buffer. An error raised while presenting is
+    raised again by the next `submit` or by `close`.
+    """
+    def __init__(self, present, buffers: list):
+        self.__present = present
+        self.__pending: queue.Queue = queue.Queue(maxsize=1)
+        self.__free: queue.Queue = queue.Queue()
+        for buffer in buffers:
+            self.__free.put(buffer)
+        self.presented = 0
+        self.waited = 0.0
+        self.__error: Exception = None
+        self.__thread = threading.Thread(target=self.__run, name='presenter', daemon=True)
+        self.__thread.start()
+
+    def submit(self, surface: Surface) -> Surface:
+        self.__raise()
+        started = time.perf_counter()
+        self.__pending.put(surface)
+        buffer = self.__free.get()
+        self.waited += time.perf_counter() - started
+        return buffer
+
+    def drain(self) -> None:
+        """ Wait until every submitted frame is presented """
+        self.__pending.join()
+
+    def close(self) -> None:
+        self.__pending.put(None)
+        self.__thread.join()
+        self.__raise()
+
+    def __raise(self) -> None:
+        if self.__error is not None:
+            error, self.__error = self.__error, None
+            raise error
+
+    def __run(self) -> None:
+        while True:
+            surface = self.__pending.get()
+            if surface is None:
+                self.__pending.task_done()
+                break
+            try:
+                if self.__error is None:
+                    self.__present(surface)
+                    self.presented += 1
+            except Exception as e:
+                """ Keep releasing buffers so the main thread raises it instead of blocking """
+                self.__error = e
+            self.__free.put(surface)
+            self.__pending.task_done()
+
+
 class Graphics(object):
-    def __init__(self, width: int, height: int, full: bool = False):
+    def __init__(self, width: int, height: int, full: bool = False, vsync: bool = False, pipelined: bool = False):
         self.size = (width * 2, height * 2)
-        if full:
-            self.screen = set_mode(self.size, HWSURFACE | DOUBLEBUF | FULLSCREEN)
-        else:
-            self.screen = set_mode(self.size)
+        flags = HWSURFACE | DOUBLEBUF | FULLSCREEN if full else 0
+        """ Whether presenting waits for the vertical blank """
+        self.vsync = False
+        if vsync:
+            """ SDL only offers vsync for renderer backed windows """
+            try:
+                self.screen = set_mode(self.size, flags | SCALED, vsync=1)
+                self.vsync = flips_block()
+            except error:
+                pass
+        if not self.vsync:
+            self.screen = set_mode(self.size, flags)
         """ temp Surface for handling the small graphics """
         self.__surface = Surface((width, height))
+        """ Callbacks receiving the back buffer once a frame is presented """
+        self.__post_render: list = []
+        self.__scalers = {'nearest': self.__scale_nearest, 'interlaced': self.__scale_interlaced}
+        self.__scaler = self.__scale_nearest
+        self.__field = 0
+        """ With `pipelined`, frames are drawn into one buffer while the other is presented """
+        self.__presenter: Presenter = None
+        if pipelined:
+            self.__presenter = Presenter(self.__present, [Surface((width, height))])
 
     def get_surface(self) -> Surface:
+        """ Back buffer to draw the next frame into, it alternates when pipelined """
         return self.__surface
 
     def render(self) -> None:
+        if self.__presenter is not None:
+            self.__surface = self.__presenter.submit(self.__surface)
+            return
         self.__surface.convert_alpha()
         # self.screen.blit(self.__surface, (0, 0))
+        self.__present(self.__surface)
+
+    def close(self) -> None:
+        if self.__presenter is not None:
+            self.__presenter.close()
+            self.__presenter = None
+
+    def __present(self, surface: Surface) -> None:
         """ upscale temp surface to screen """
-        scale(self.__surface, self.size, self.screen)
+        self.__scaler(surface)
         update()
+        for callback in tuple(self.__post_render):
+            callback(surface)
+
+    def set_scaler(self, name: str) -> None:
+        """
+        'nearest' scales the whole frame. 'interlaced' scales the upper or
+        the lower half on alternate frames, for about half the cost.
+        """
+        self.__scaler = self.__scalers[name]
+
+    def __scale_nearest(self, surface: Surface) -> None:
+        scale(surface, self.size, self.screen)
+
+    def __scale_interlaced(self, surface: Surface) -> None:
+        width, height = surface.get_size()
+        half = height // 2
+        top = half * self.__field
+        rows = half if self.__field == 0 else height - half
+        self.__field ^= 1
+        scale(surface.subsurface((0, top, width, rows)), (self.size[0], rows * 2),
+              self.screen.subsurface((0, top * 2, self.size[0], rows * 2)))
+
+    def add_post_render(self, callback) -> None:
+        self.__post_render.append(callback)
+
+    def remove_post_render(self, callback) -> None:
+        if self.__presenter is not None:
+            self.__presenter.drain()
+        self.__post_render.remove(callback)
+
+
+class RenderQueue(object):
+    """
+    Draws several sprite groups with a single `fblits` (or `blits`) call.
+    Groups are kept ordered by layer when they are added, so each frame
+    only gathers (image, rect) pairs, lower layers first and groups of the
+    same layer in the order they were added.
+    """
+    def __init__(self):
+        self.__groups: list = []
+        self.__items: list = []
+
+    def add(self, group: object, layer: int = 0) -> None:
+        self.__groups.append((layer, len(self.__groups), group))
+        self.__groups.sort(key=lambda g: (g[0], g[1]))
+
+    def remove(self, group: object) -> None:
+        self.__groups = [g for g in self.__groups if g[2] is not group]
+
+    def get_count(self) -> int:
+        """ Sprites drawn by the last `draw` """
+        return len(self.__items)
+
+    def draw(self, surface: Surface, culler: object = None) -> None:
+        """ With a `Culler`, only sprites inside its view are drawn """
+        items = self.__items
+        items.clear()
+        for layer, order, group in self.__groups:
+            if culler is not None:
+                items.extend(culler.visible(group))
+            else:
+                items.extend([(sprite.image, sprite.rect) for sprite in group])
+        fblits = getattr(surface, 'fblits', None)
+        if fblits is not None:
+            fblits(items)
+        else:
+            surface.blits(items, doreturn=False)
 
 
 class SpriteSheet(object):
+    """ Decoded sheets by filename, filled by `AssetLoader` or on first use """
+    cache: dict = {}
 
     def __init__(self, filename):
-        self.sprite_sheet = image.load(filename)
+        sheet = SpriteSheet.cache.get(filename)
+        if sheet is None:
+            sheet = image.load(filename)
+            SpriteSheet.cache[filename] = sheet
+        self.sprite_sheet = sheet
 
     def get_image(self, x: int, y: int, width: int, height: int) -> Surface:
         image = Surface([width, height], SRCALPHA).convert_alpha()
@@ -47,6 +232,38 @@ class ImageFactory(object):
     def get_image(self, index: int) -> Surface:
         raise NotImplementedError("Implement `get_image` method.")
 
+    def get_mask(self, index: int) -> Mask:
+        raise NotImplementedError("Implement `get_mask` method.")
+
+    def get_images(self) -> list:
+        raise NotImplementedError("Implement `get_images` method.")
+
+
+def build_masks(images: list) -> list:
+    """
+    Collision masks for a list of images, built once at load time
+    so sprites never call `from_surface` while playing.
+    """
+    return [from_surface(image) for image in images]
+
+
+class FlippedImageFactory(ImageFactory):
+    """
+    Mirrored copies, and their masks, of every image of another factory.
+    """
+    def __init__(self, factory: ImageFactory, x: bool = False, y: bool = True):
+        self.images = [flip(image, x, y) for image in factory.get_images()]
+        self.masks = build_masks(self.images)
+
+    def get_image(self, index: int) -> Surface:
+        return self.images[index]
+
+    def get_mask(self, index: int) -> Mask:
+        return self.masks[index]
+
+    def get_images(self) -> list:
+        return self.images
+
 
 class TileFactory(object):
     """
@@ -75,6 +292,70 @@ class TileImageFactory(ImageFactory):
         return self.image
 
 
+class StaticLayerRenderer(object):
+    """
+    Prerenders static tile layers into horizontal strips, so a frame
+    costs one blit per visible strip whatever the number of tiles.
+    Strip surfaces are created when first visible and at most `capacity`
+    are kept, the least recently drawn is dropped first, so tall stages
+    do not hold their whole height in memory.
+    Strips are redrawn only after `invalidate`, lazily on the next draw.
+    """
+    STRIP_HEIGHT = 256
+    CAPACITY = 8
+
+    def __init__(self, layers: list, image_factory: ImageFactory, size: tuple, strip_height: int = STRIP_HEIGHT,
+                 capacity: int = CAPACITY):
+        self.__layers = layers
+        self.__image_factory = image_factory
+        self.__strips: list = []
+        self.__surfaces: OrderedDict = OrderedDict()
+        self.__dirty: set = set()
+        self.capacity = capacity
+        self.strip_height = strip_height
+        if len(layers) == 0:
+            return
+        width, height = size
+        for top in range(0, height, strip_height):
+            self.__strips.append(Rect(0, top, width, min(strip_height, height - top)))
+
+    def invalidate(self, area: Rect = None) -> None:
+        for index in self.__surfaces:
+            if area is None or self.__strips[index].colliderect(area):
+                self.__dirty.add(index)
+
+    def set_tile(self, layer: object, col: int, row: int, id: int) -> None:
+        self.invalidate(layer.set_tile(col, row, id))
+
+    def draw(self, surface: Surface, camera: Rect) -> None:
+        first = max(0, camera.top // self.strip_height)
+        last = min(len(self.__strips), (camera.bottom - 1) // self.strip_height + 1)
+        for index in range(first, last):
+            rect = self.__strips[index]
+            if not rect.colliderect(camera):
+                continue
+            strip = self.__surfaces.get(index)
+            if strip is None:
+                strip = Surface(rect.size, SRCALPHA)
+                self.__surfaces[index] = strip
+                self.__dirty.add(index)
+                while len(self.__surfaces) > self.capacity:
+                    self.__dirty.discard(self.__surfaces.popitem(last=False)[0])
+            else:
+                self.__surfaces.move_to_end(index)
+            if index in self.__dirty:
+                self.__render(rect, strip)
+                self.__dirty.discard(index)
+            surface.blit(strip, (rect.left - camera.left, rect.top - camera.top))
+
+    def __render(self, rect: Rect, strip: Surface) -> None:
+        strip.fill((0, 0, 0, 0))
+        for layer in self.__layers:
+            for item in layer.get_items_in(rect):
+                tile = item.get_rect()
+                strip.blit(self.__image_factory.get_image(item.get_id()), (tile.left, tile.top - rect.top))
+
+
 class Tile(Sprite):
     COLOR = (55, 153, 50)
 
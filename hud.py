@@ -0,0 +1,89 @@
+from pygame import Rect, Surface, RLEACCEL
+from font import FontFactory
+
+
+class Widget(object):
+    """
+    Draws a bound value into its rect of the HUD layer.
+    `source` is called every frame; the widget re-renders only when the
+    returned value differs from the last one drawn.
+    """
+    def __init__(self, rect: Rect, source):
+        self.rect = rect
+        self.source = source
+        self.__value = None
+        self.__drawn = False
+
+    def update(self, layer: Surface, origin: tuple, background: tuple) -> bool:
+        value = self.source()
+        if self.__drawn and value == self.__value:
+            return False
+        self.__value = value
+        self.__drawn = True
+        area = self.rect.move(-origin[0], -origin[1])
+        layer.fill(background, area)
+        self.render(layer, area, value)
+        return True
+
+    def invalidate(self) -> None:
+        self.__drawn = False
+
+    def render(self, layer: Surface, area: Rect, value: object) -> None:
+        raise NotImplementedError("Implement `render` method.")
+
+
+class TextWidget(Widget):
+    def __init__(self, rect: Rect, source, font: FontFactory):
+        super().__init__(rect, source)
+        self.font = font
+
+    def render(self, layer: Surface, area: Rect, value: object) -> None:
+        self.font.render(str(value), layer, area.topleft)
+
+
+class NumberWidget(TextWidget):
+    """ Zero padded number, like the arcade score """
+    def __init__(self, rect: Rect, source, font: FontFactory, digits: int = 8):
+        super().__init__(rect, source, font)
+        self.digits = digits
+
+    def render(self, layer: Surface, area: Rect, value: object) -> None:
+        self.font.render(str(value).zfill(self.digits), layer, area.topleft)
+
+
+class Hud(object):
+    """
+    Side panel and widgets composed into one cached layer.
+    The layer spans the panel and every widget; pixels outside both are a
+    color key, so the whole HUD is one RLE accelerated blit per frame.
+    """
+    KEY = (255, 0, 255)
+
+    def __init__(self, panel: Rect, color: tuple):
+        self.panel = panel
+        self.color = color
+        self.__widgets: list = []
+        self.__area = panel.copy()
+        self.__layer: Surface = None
+
+    def add(self, widget: Widget) -> None:
+        self.__widgets.append(widget)
+        self.__area.union_ip(widget.rect)
+        self.__layer = None
+
+    def draw(self, surface: Surface) -> None:
+        if self.__layer is None:
+            self.__build()
+        origin = self.__area.topleft
+        for widget in self.__widgets:
+            background = self.color if self.panel.contains(widget.rect) else self.KEY
+            widget.update(self.__layer, origin, background)
+        surface.blit(self.__layer, origin)
+
+    def __build(self) -> None:
+        self.__layer = Surface(self.__area.size).convert()
+        self.__layer.fill(self.KEY)
+        self.__layer.fill(self.color, self.panel.move(-self.__area.left, -self.__area.top))
+        self.__layer.set_colorkey(self.KEY, RLEACCEL)
+        for widget in self.__widgets:
+            widget.invalidate()
@@ -1,8 +1,30 @@
+from startup import tracer
+import asyncio
+import sys
 import pygame
-from pygame.locals import K_ESCAPE, QUIT, KEYUP, KEYDOWN, K_d
+import time
+from pygame.locals import K_ESCAPE, QUIT, KEYUP, KEYDOWN, K_d, K_r
 from pygame.event import Event
 from game import Game
 from controls import Controller
+from recorder import Recorder, PngSequenceWriter
+import os
+from assets import AssetLoader
+from pack import open_pack, PACK_FILE
+from telemetry import TelemetryLog
+from governor import QualityGovernor
+from pacer import AsyncPacer, FramePacer, PACERS
+from scheduler import FrameScheduler
+import logging
+
+
+def get_option(name: str, default: str) -> str:
+    """ Value of a `--name=value` command line option """
+    prefix = '--%s=' % name
+    for arg in sys.argv:
+        if arg.startswith(prefix):
+            return arg[len(prefix):]
+    return default
 
 
 class App(object):
@@ -10,25 +32,87 @@ class App(object):
 
     def __init__(self):
         self.running = True
+        self.recorder: Recorder = None
+        self.telemetry: TelemetryLog = None
+        self.pacer: FramePacer = None
+        """ Set when running on the asyncio loop, register background jobs with it """
+        self.scheduler: FrameScheduler = None
+        self.__rendered = 0.0
+        self.__first = True
 
     def on_init(self) -> None:
-        pygame.init()
-        self.controller = Controller()
-        self.game = Game(self.controller)
+        tracer.stop_imports()
+        loader = None
+        if os.path.exists(PACK_FILE):
+            with tracer.phase('asset pack map'):
+                loader = open_pack(PACK_FILE)
+        if loader is None:
+            loader = AssetLoader(tracer=tracer)
+            with tracer.phase('asset decode start'):
+                loader.start()
+        with tracer.phase('pygame.init'):
+            pygame.init()
+        with tracer.phase('controller'):
+            self.controller = Controller()
+        with tracer.phase('asset install'):
+            loader.install()
+        pacer = get_option('pacer', 'sleep') if self.scheduler is None else 'async'
+        with tracer.phase('game'):
+            self.game = Game(self.controller, vsync=pacer == 'vsync', swarm='--swarm' in sys.argv,
+                             pipelined='--pipelined' in sys.argv)
+        if pacer == 'vsync' and not self.game.graphics.vsync:
+            logging.warning('vsync is not available, pacing with hybrid')
+            pacer = 'hybrid'
+        self.pacer = AsyncPacer(self.FPS) if pacer == 'async' else PACERS[pacer](self.FPS)
+        self.governor = QualityGovernor(1000 / self.FPS, self.game.set_quality)
+        if '--telemetry' in sys.argv:
+            self.telemetry = TelemetryLog('telemetry/%s.jsonl' % time.strftime('%Y%m%d-%H%M%S'), 1000 / self.FPS)
+            self.telemetry.start(thread=self.scheduler is None)
+            if self.scheduler is not None:
+                self.scheduler.add_job('telemetry', self.telemetry.write_job, 2.0)
 
     def on_loop(self, time: int) -> None:
         self.controller.on_event()
         self.game.update(time)
 
     def on_render(self) -> None:
-        self.game.render()
+        self.game.draw()
+        self.__rendered = time.perf_counter()
+        self.game.present()
 
     def on_exit(self) -> None:
         self.running = False
 
     def on_cleanup(self):
+        self.game.close()
+        if self.recorder is not None:
+            self.recorder.stop()
+        if self.telemetry is not None:
+            self.telemetry.stop()
+        stats = self.pacer.stats()
+        logging.info('%s: %d frames, mean %.2f ms, jitter %.2f ms, max deviation %.2f ms, cpu %.2f ms/frame',
+                     type(self.pacer).__name__, stats['frames'], stats['mean'], stats['stddev'],
+                     stats['max_deviation'], stats['cpu'])
+        culled = self.game.get_cull_stats()
+        if culled:
+            logging.info('culling: %.1f%% of %d sprite draws culled, %d projectiles despawned, '
+                         '%d animation ticks skipped', culled['cull_rate'] * 100, culled['tested'],
+                         culled['despawned'], culled['animation_skipped'])
         pygame.quit()
 
+    def toggle_recording(self) -> None:
+        """ Record a PNG sequence into recordings/<timestamp> """
+        graphics = self.game.graphics
+        if self.recorder is not None:
+            graphics.remove_post_render(self.recorder.capture)
+            self.recorder.stop()
+            self.recorder = None
+            return
+        directory = 'recordings/%s' % time.strftime('%Y%m%d-%H%M%S')
+        self.recorder = Recorder(PngSequenceWriter(directory))
+        self.recorder.start(graphics.get_surface())
+        graphics.add_post_render(self.recorder.capture)
+
     def on_key_down(self, event: Event):
         self.controller.key_down(event)
 
@@ -37,6 +121,8 @@ class App(object):
             self.running = False
         if event.key == K_d:
             self.game.toggle_debug()
+        if event.key == K_r:
+            self.toggle_recording()
         self.controller.key_up(event)
 
     def on_event(self, event: Event) -> None:
@@ -47,21 +133,48 @@ class App(object):
         elif event.type == KEYDOWN:
             self.on_key_down(event)
 
+    def on_frame(self, frame: int) -> None:
+        started = time.perf_counter()
+        for event in pygame.event.get():
+            self.on_event(event)
+        self.on_loop(self.pacer.get_time())
+        updated = time.perf_counter()
+        self.on_render()
+        presented = time.perf_counter()
+        self.governor.record((presented - started) * 1000)
+        if self.telemetry is not None:
+            level, sprites, enemies, bullets = self.game.get_metrics()
+            self.telemetry.record(frame, (updated - started) * 1000, (self.__rendered - updated) * 1000,
+                                  (presented - self.__rendered) * 1000,
+                                  sprites, enemies, bullets, level, self.governor.get_quality().name)
+        if self.__first:
+            self.__first = False
+            tracer.mark('first frame')
+            if '--profile-startup' in sys.argv:
+                tracer.report()
+
     def on_execute(self):
         if self.on_init() is False:
             return
 
-        clock = pygame.time.Clock()
-
         while(self.running):
-            clock.tick(self.FPS)
-            for event in pygame.event.get():
-                self.on_event(event)
-            self.on_loop(clock.get_time())
-            self.on_render()
+            self.on_frame(self.pacer.tick())
+        self.on_cleanup()
+
+    async def on_execute_async(self):
+        """ `on_execute` on an asyncio loop, background jobs run between frames """
+        self.scheduler = FrameScheduler()
+        if self.on_init() is False:
+            return
+
+        await self.scheduler.run(self.pacer, self.on_frame, lambda: self.running)
         self.on_cleanup()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
     app = App()
-    app.on_execute()
+    if '--asyncio' in sys.argv:
+        asyncio.run(app.on_execute_async())
+    else:
+        app.on_execute()
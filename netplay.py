@@ -0,0 +1,303 @@
+from __future__ import annotations
+import heapq
+import random
+import socket
+import struct
+import time
+from controls import AiController, UserInput, State
+from game import PlayGameState
+from rng import RandomService
+from pygame import Rect
+
+
+""" Simulated milliseconds per tick, the frame time of `App.FPS` """
+FRAME_TIME = 33
+
+""" Button bit order for packed inputs """
+BUTTONS = [State.X, State.Y, State.A, State.B, State.R, State.L, State.START, State.SELECT]
+
+PACKET_HEADER = struct.Struct('<IB')
+
+
+def now() -> float:
+    """ Monotonic clock in milliseconds """
+    return time.monotonic() * 1000
+
+
+def pack_input(user_input: UserInput) -> int:
+    """
+    Pack direction and buttons into 12 bits:
+    x + 1 and y + 1 in the two low pairs, then one bit per button.
+    """
+    value = (user_input.direction.x + 1) | ((user_input.direction.y + 1) << 2)
+    for bit, button in enumerate(BUTTONS):
+        if user_input.button.is_pressed(button):
+            value |= 1 << (bit + 4)
+    return value
+
+
+def unpack_input(value: int, user_input: UserInput) -> None:
+    user_input.direction.update((value & 3) - 1, ((value >> 2) & 3) - 1)
+    for bit, button in enumerate(BUTTONS):
+        if value & (1 << (bit + 4)):
+            user_input.button.pressed(button)
+        else:
+            user_input.button.released(button)
+
+
+NEUTRAL_INPUT = pack_input(AiController().get_user_input())
+
+
+class Transport(object):
+    """
+    Carries input packets between peers. Delivery may be late or reordered.
+    """
+    def __init__(self):
+        raise RuntimeError("Can not instatiate")
+
+    def send(self, packet: bytes) -> None:
+        raise NotImplementedError("Implement `send` method.")
+
+    def receive(self) -> list:
+        raise NotImplementedError("Implement `receive` method.")
+
+
+class LoopbackTransport(Transport):
+    """
+    In-process transport. Every packet is delayed by `latency` plus a
+    uniform `jitter` in milliseconds, so packets may arrive out of order.
+    """
+    def __init__(self, latency: float = 0, jitter: float = 0, seed: int = None, clock=now):
+        self.peer: LoopbackTransport = None
+        self.latency = latency
+        self.jitter = jitter
+        self.__clock = clock
+        """ Own generator, must not disturb the game's random state """
+        self.__random = random.Random(seed)
+        self.__queue: list = []
+        self.__sequence = 0
+
+    @staticmethod
+    def pair(latency: float = 0, jitter: float = 0, seed: int = None, clock=now) -> tuple:
+        first = LoopbackTransport(latency, jitter, seed, clock)
+        second = LoopbackTransport(latency, jitter, None if seed is None else seed + 1, clock)
+        first.peer = second
+        second.peer = first
+        return first, second
+
+    def send(self, packet: bytes) -> None:
+        delay = max(0, self.latency + self.__random.uniform(-self.jitter, self.jitter))
+        self.__sequence += 1
+        heapq.heappush(self.peer.__queue, (self.__clock() + delay, self.__sequence, packet))
+
+    def receive(self) -> list:
+        packets = []
+        current = self.__clock()
+        while self.__queue and self.__queue[0][0] <= current:
+            packets.append(heapq.heappop(self.__queue)[2])
+        return packets
+
+
+class UdpTransport(Transport):
+    """
+    Non-blocking UDP transport for linked cabinets on a LAN.
+    """
+    def __init__(self, bind: tuple, remote: tuple):
+        self.remote = remote
+        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__socket.bind(bind)
+        self.__socket.setblocking(False)
+
+    def send(self, packet: bytes) -> None:
+        self.__socket.sendto(packet, self.remote)
+
+    def receive(self) -> list:
+        packets = []
+        while True:
+            try:
+                packet, address = self.__socket.recvfrom(512)
+            except BlockingIOError:
+                return packets
+            packets.append(packet)
+
+    def close(self) -> None:
+        self.__socket.close()
+
+
+class Simulation(object):
+    """
+    Deterministic game step driven only by player inputs.
+    """
+    def __init__(self):
+        raise RuntimeError("Can not instatiate")
+
+    def step(self, inputs: list) -> None:
+        raise NotImplementedError("Implement `step` method.")
+
+    def save_state(self) -> bytes:
+        raise NotImplementedError("Implement `save_state` method.")
+
+    def load_state(self, data: bytes) -> None:
+        raise NotImplementedError("Implement `load_state` method.")
+
+
+class PlaySimulation(Simulation):
+    """
+    Headless `PlayGameState` step. Each player gets an `AiController`.
+    The level has a single craft, driven by player 0; the other inputs are
+    synchronised and available on `controllers` for modes that use them.
+    Each simulation owns its `RandomService`, so several can share a
+    process and peers seeded alike stay in step.
+    """
+    def __init__(self, screen: Rect, players: int = 2, seed: int = 0):
+        self.state = PlayGameState(screen, RandomService(seed))
+        self.controllers = [AiController() for i in range(players)]
+
+    def step(self, inputs: list) -> None:
+        for value, controller in zip(inputs, self.controllers):
+            unpack_input(value, controller.user_input)
+        self.state.update(FRAME_TIME, self.controllers[0])
+
+    def save_state(self) -> bytes:
+        return self.state.save_state()
+
+    def load_state(self, data: bytes) -> None:
+        self.state.load_state(data)
+
+
+class RollbackSession(object):
+    """
+    Two peer rollback session.
+
+    Local input is scheduled `input_delay` ticks ahead and sent every tick,
+    together with the previous `redundancy` inputs to cover lost packets.
+    Missing remote input is predicted by repeating the last one known. When
+    a late input differs from its prediction the simulation is restored to
+    the state saved before that tick and re-simulated up to the present.
+    The session stalls instead of predicting more than `max_rollback` ticks.
+    """
+    def __init__(self,
+                 simulation: Simulation,
+                 transport: Transport,
+                 local_player: int,
+                 input_delay: int = 2,
+                 max_rollback: int = 8,
+                 redundancy: int = 4):
+        self.simulation = simulation
+        self.transport = transport
+        self.local_player = local_player
+        self.input_delay = input_delay
+        self.max_rollback = max_rollback
+        self.redundancy = redundancy
+        """ Next tick to simulate """
+        self.frame = 0
+        self.__local: dict = {}
+        self.__remote: dict = {}
+        self.__predicted: dict = {}
+        self.__states: dict = {}
+        """ Every remote input up to this tick has arrived """
+        self.__confirmed = input_delay - 1
+        self.__rollback_to = None
+        for frame in range(input_delay):
+            self.__local[frame] = NEUTRAL_INPUT
+            self.__remote[frame] = NEUTRAL_INPUT
+        self.stats = {
+            'frames': 0,
+            'stalls': 0,
+            'rollbacks': 0,
+            'resimulated': 0,
+            'max_depth': 0,
+            'rollback_ms': 0.0
+        }
+
+    def add_local_input(self, user_input: UserInput) -> None:
+        """
+        Record the local input for tick `frame + input_delay` and send it.
+        Call once per tick, before `advance`.
+        """
+        target = self.frame + self.input_delay
+        if target in self.__local:
+            return
+        self.__local[target] = pack_input(user_input)
+        start = max(0, target - self.redundancy)
+        inputs = [self.__local.get(f, NEUTRAL_INPUT) for f in range(start, target + 1)]
+        self.transport.send(PACKET_HEADER.pack(start, len(inputs)) + struct.pack('<%dH' % len(inputs), *inputs))
+
+    def advance(self) -> bool:
+        """
+        Simulate one tick. Returns False when stalled waiting on the peer.
+        """
+        self.__poll()
+        if self.__rollback_to is not None:
+            self.__rollback()
+        if self.frame - self.__confirmed > self.max_rollback or self.frame not in self.__local:
+            self.stats['stalls'] += 1
+            return False
+        self.__simulate(self.frame)
+        self.frame += 1
+        self.stats['frames'] += 1
+        self.__prune()
+        return True
+
+    def get_confirmed_frame(self) -> int:
+        return self.__confirmed
+
+    def get_rollback_cost(self) -> float:
+        """ Average milliseconds spent re-simulating per simulated tick """
+        if self.stats['frames'] == 0:
+            return 0.0
+        return self.stats['rollback_ms'] / self.stats['frames']
+
+    def __poll(self) -> None:
+        for packet in self.transport.receive():
+            start, count = PACKET_HEADER.unpack_from(packet)
+            inputs = struct.unpack_from('<%dH' % count, packet, PACKET_HEADER.size)
+            for offset, value in enumerate(inputs):
+                self.__receive(start + offset, value)
+        while self.__confirmed + 1 in self.__remote:
+            self.__confirmed += 1
+
+    def __receive(self, frame: int, value: int) -> None:
+        if frame in self.__remote or frame <= self.__confirmed:
+            return
+        self.__remote[frame] = value
+        predicted = self.__predicted.pop(frame, None)
+        if predicted is not None and predicted != value:
+            if self.__rollback_to is None or frame < self.__rollback_to:
+                self.__rollback_to = frame
+
+    def __rollback(self) -> None:
+        start = time.perf_counter()
+        frame = self.__rollback_to
+        self.__rollback_to = None
+        self.simulation.load_state(self.__states[frame])
+        depth = self.frame - frame
+        for f in range(frame, self.frame):
+            self.__simulate(f)
+        self.stats['rollbacks'] += 1
+        self.stats['resimulated'] += depth
+        self.stats['max_depth'] = max(self.stats['max_depth'], depth)
+        self.stats['rollback_ms'] += (time.perf_counter() - start) * 1000
+
+    def __simulate(self, frame: int) -> None:
+        self.__states[frame] = self.simulation.save_state()
+        remote = self.__remote.get(frame)
+        if remote is None:
+            remote = self.__remote[self.__confirmed]
+            self.__predicted[frame] = remote
+        inputs = [0, 0]
+        inputs[self.local_player] = self.__local[frame]
+        inputs[1 - self.local_player] = remote
+        self.simulation.step(inputs)
+
+    def __prune(self) -> None:
+        """ States and inputs before the confirmed tick can not be rolled back to """
+        oldest = min(self.__confirmed, self.frame - 1)
+        for frame in [f for f in self.__states if f < oldest]:
+            del self.__states[frame]
+        for frame in [f for f in self.__remote if f < oldest]:
+            del self.__remote[frame]
+        """ Local inputs are resent for `redundancy` ticks """
+        oldest = min(oldest, self.frame + self.input_delay - self.redundancy)
+        for frame in [f for f in self.__local if f < oldest]:
+            del self.__local[frame]
@@ -0,0 +1,93 @@
+from __future__ import annotations
+from contextlib import contextmanager
+import numpy
+from pygame import Surface, surfarray
+
+
+class FrameObserver(object):
+    """
+    Exposes a back buffer, e.g. `Graphics.get_surface()`, as NumPy arrays.
+
+    `frame()` yields a zero-copy (height, width, 3) view of the surface.
+    The view keeps the surface locked and a locked surface can not be drawn
+    on, so the view must only be used between `render` calls and no
+    reference to it may outlive the `with` block.
+
+    `capture()` downsamples by `factor` (nearest), optionally converts to
+    grayscale and writes the result into the next slot of a preallocated
+    ring of `stack` frames. No arrays are allocated per capture.
+    """
+    """ ITU-R 601 luma weights scaled by 256 """
+    LUMA = (77, 150, 29)
+
+    def __init__(self, surface: Surface, factor: int = 1, grayscale: bool = False, stack: int = 1):
+        self.__surface = surface
+        self.factor = factor
+        self.grayscale = grayscale
+        width, height = surface.get_size()
+        self.width = (width + factor - 1) // factor
+        self.height = (height + factor - 1) // factor
+        shape = (stack, self.height, self.width) if grayscale else (stack, self.height, self.width, 3)
+        self.__frames = numpy.zeros(shape, dtype=numpy.uint8)
+        self.__order = numpy.zeros(stack, dtype=numpy.intp)
+        self.__index = 0
+        self.__count = 0
+        if grayscale:
+            self.__acc = numpy.zeros((self.height, self.width), dtype=numpy.uint16)
+            self.__tmp = numpy.zeros((self.height, self.width), dtype=numpy.uint16)
+
+    @contextmanager
+    def frame(self):
+        pixels = surfarray.pixels3d(self.__surface)
+        try:
+            yield pixels.transpose(1, 0, 2)
+        finally:
+            """ Dropping the last reference unlocks the surface """
+            del pixels
+
+    def capture(self) -> numpy.ndarray:
+        """ Process the current frame into the ring and return its slot """
+        out = self.__frames[self.__index]
+        pixels = surfarray.pixels3d(self.__surface)
+        src = pixels[::self.factor, ::self.factor].transpose(1, 0, 2)
+        if self.grayscale:
+            self.__luma(src, out)
+        else:
+            numpy.copyto(out, src)
+        del src, pixels
+        self.__index = (self.__index + 1) % len(self.__frames)
+        self.__count = min(self.__count + 1, len(self.__frames))
+        return out
+
+    def get_stack(self, out: numpy.ndarray = None) -> numpy.ndarray:
+        """
+        Frames oldest first. Slots not yet captured are zero.
+        Pass `out` with the shape of `get_frames()` to avoid allocation.
+        """
+        stack = len(self.__frames)
+        numpy.add(numpy.arange(stack), self.__index, out=self.__order)
+        numpy.remainder(self.__order, stack, out=self.__order)
+        return numpy.take(self.__frames, self.__order, axis=0, out=out)
+
+    def get_frames(self) -> numpy.ndarray:
+        """ Raw ring storage, slot order is not chronological """
+        return self.__frames
+
+    def get_count(self) -> int:
+        return self.__count
+
+    def reset(self) -> None:
+        self.__frames.fill(0)
+        self.__index = 0
+        self.__count = 0
+
+    def __luma(self, src: numpy.ndarray, out: numpy.ndarray) -> None:
+        acc = self.__acc
+        tmp = self.__tmp
+        numpy.multiply(src[..., 0], self.LUMA[0], out=acc, dtype=numpy.uint16)
+        numpy.multiply(src[..., 1], self.LUMA[1], out=tmp, dtype=numpy.uint16)
+        numpy.add(acc, tmp, out=acc)
+        numpy.multiply(src[..., 2], self.LUMA[2], out=tmp, dtype=numpy.uint16)
+        numpy.add(acc, tmp, out=acc)
+        numpy.right_shift(acc, 8, out=acc)
+        numpy.copyto(out, acc, casting='unsafe')
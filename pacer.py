@@ -0,0 +1,136 @@
+import math
+import time
+from collections import deque
+from pygame import display
+from pygame.time import Clock
+
+
+class FramePacer(object):
+    """
+    Waits out the rest of each frame and measures how regular frames are.
+    `tick` returns the milliseconds since the previous tick, like
+    `Clock.tick`. Statistics cover the last `history` intervals: jitter
+    as standard deviation and largest deviation from the target interval,
+    and the process CPU time spent per frame, waiting included.
+    """
+    def __init__(self, fps: int, history: int = 300):
+        self.fps = fps
+        self.interval = 1000 / fps
+        self.__intervals: deque = deque(maxlen=history)
+        self.__cpu: deque = deque(maxlen=history)
+        self.__last: float = None
+        self.__last_cpu = 0.0
+        self.__time = 0
+
+    def tick(self) -> int:
+        self.wait()
+        now = time.perf_counter()
+        cpu = time.process_time()
+        if self.__last is not None:
+            elapsed = (now - self.__last) * 1000
+            self.__intervals.append(elapsed)
+            self.__cpu.append((cpu - self.__last_cpu) * 1000)
+            self.__time = int(round(elapsed))
+        self.__last = now
+        self.__last_cpu = cpu
+        return self.__time
+
+    def get_time(self) -> int:
+        return self.__time
+
+    def get_deadline(self) -> float:
+        """ perf_counter value the current frame should end at """
+        if self.__last is None:
+            return time.perf_counter()
+        return self.__last + self.interval / 1000
+
+    def wait(self) -> None:
+        raise NotImplementedError("Implement `wait` method.")
+
+    def stats(self) -> dict:
+        intervals = self.__intervals
+        count = len(intervals)
+        if count == 0:
+            return {'frames': 0, 'mean': 0.0, 'stddev': 0.0, 'max_deviation': 0.0, 'cpu': 0.0}
+        mean = sum(intervals) / count
+        return {
+            'frames': count,
+            'mean': mean,
+            'stddev': math.sqrt(sum((i - mean) ** 2 for i in intervals) / count),
+            'max_deviation': max(abs(i - self.interval) for i in intervals),
+            'cpu': sum(self.__cpu) / count
+        }
+
+
+class SleepPacer(FramePacer):
+    """ `Clock.tick`, sleeps with millisecond granularity, least CPU """
+    def __init__(self, fps: int, history: int = 300):
+        super().__init__(fps, history)
+        self.__clock = Clock()
+
+    def wait(self) -> None:
+        self.__clock.tick(self.fps)
+
+
+class BusyLoopPacer(FramePacer):
+    """ `Clock.tick_busy_loop`, accurate but spins a core for the whole wait """
+    def __init__(self, fps: int, history: int = 300):
+        super().__init__(fps, history)
+        self.__clock = Clock()
+
+    def wait(self) -> None:
+        self.__clock.tick_busy_loop(self.fps)
+
+
+class HybridPacer(FramePacer):
+    """
+    Sleeps until `spin` milliseconds before the deadline, then spins on
+    `perf_counter`. Close to busy loop accuracy for a fraction of its CPU.
+    """
+    def __init__(self, fps: int, spin: float = 2.0, history: int = 300):
+        super().__init__(fps, history)
+        self.spin = spin
+
+    def wait(self) -> None:
+        deadline = self.get_deadline()
+        remaining = deadline - time.perf_counter() - self.spin / 1000
+        if remaining > 0:
+            time.sleep(remaining)
+        while time.perf_counter() < deadline:
+            pass
+
+
+class VsyncPacer(FramePacer):
+    """
+    The display flip blocks until the vertical blank. When the display
+    refreshes faster than `fps`, sleeps until half a refresh before the
+    deadline so the next flip lands on the blank closest to it. Needs a
+    display created with vsync, see `Graphics.vsync`.
+    """
+    def __init__(self, fps: int, refresh: int = 0, history: int = 300):
+        super().__init__(fps, history)
+        if not refresh:
+            """ Only pygame-ce reports the refresh rate """
+            current = getattr(display, 'get_current_refresh_rate', None)
+            refresh = current() if current is not None else 0
+        self.refresh = refresh or 60
+
+    def wait(self) -> None:
+        remaining = self.get_deadline() - time.perf_counter() - 0.5 / self.refresh
+        if remaining > 0:
+            time.sleep(remaining)
+
+
+class AsyncPacer(FramePacer):
+    """ Measures only, `FrameScheduler` awaits the deadlines itself """
+    def wait(self) -> None:
+        pass
+
+
+""" Pacers by command line name """
+PACERS = {
+    'sleep': SleepPacer,
+    'busy': BusyLoopPacer,
+    'hybrid': HybridPacer,
+    'vsync': VsyncPacer,
+}
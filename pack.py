@@ -0,0 +1,150 @@
+import json
+import logging
+import marshal
+import mmap
+import os
+import struct
+import sys
+from pygame import image, Surface
+from graphics import SpriteSheet
+from array import array
+from tiled_parser import TiledParser, load_level
+from assets import IMAGES, LEVELS
+
+logger = logging.getLogger(__name__)
+
+""" Asset pack header: magic, version, index offset, index size """
+MAGIC = b'GLGP'
+VERSION = 2
+HEADER = struct.Struct('<4sHxxQQ')
+""" Pixel blocks start on this boundary """
+ALIGN = 64
+""" Default pack location, used by main when present """
+PACK_FILE = 'resources/assets.pack'
+
+
+def build_pack(filename: str, images: list, levels: list) -> dict:
+    """
+    Write the sprite sheets as raw RGBA pixels and the levels as marshalled
+    dicts into one file, followed by a JSON index of name -> entry.
+    Entries keep the modification time and size of their source file.
+    Returns the index.
+    """
+    index = {}
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        for name in images:
+            sheet = image.load(name)
+            data = image.tobytes(sheet, 'RGBA')
+            offset = write_block(f, data)
+            index[name] = {'kind': 'image', 'offset': offset, 'size': len(data),
+                           'width': sheet.get_width(), 'height': sheet.get_height(), 'source': stamp(name)}
+        for name in levels:
+            data = marshal.dumps(plain(load_level(name)))
+            offset = write_block(f, data)
+            index[name] = {'kind': 'level', 'offset': offset, 'size': len(data), 'source': stamp(name)}
+        table = json.dumps(index).encode()
+        offset = write_block(f, table)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, offset, len(table)))
+    return index
+
+
+def stamp(filename: str) -> list:
+    """ Modification time and size, enough to tell an edited source """
+    stat = os.stat(filename)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def plain(value: object) -> object:
+    """ TMX levels hold gids in arrays, marshal wants lists """
+    if isinstance(value, dict):
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [plain(item) for item in value]
+    if isinstance(value, array):
+        return value.tolist()
+    return value
+
+
+def write_block(f, data: bytes) -> int:
+    offset = -f.tell() % ALIGN + f.tell()
+    f.write(b'\0' * (offset - f.tell()))
+    f.write(data)
+    return offset
+
+
+class AssetPack(object):
+    """
+    Memory maps a pack built by `build_pack`.
+    Sheets are surfaces created with `image.frombuffer` straight over the
+    mapping, so no pixel is read from disk until it is first touched and no
+    copy is made. The mapping is copy on write: drawing on a sheet copies
+    the touched pages and never reaches the file. It stays open while the
+    pack lives, the surfaces reference it.
+    """
+    def __init__(self, filename: str = PACK_FILE):
+        self.filename = filename
+        self.__file = open(filename, 'rb')
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_COPY)
+        self.__view = memoryview(self.__map)
+        magic, version, offset, size = HEADER.unpack_from(self.__map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not an asset pack: %s" % filename)
+        self.index: dict = json.loads(bytes(self.__view[offset:offset + size]))
+
+    def is_current(self, names: list) -> bool:
+        """ Every name is packed and no source file changed since the build """
+        for name in names:
+            entry = self.index.get(name)
+            if entry is None:
+                return False
+            """ A pack shipped without its sources is current """
+            if os.path.exists(name) and stamp(name) != entry['source']:
+                return False
+        return True
+
+    def close(self) -> None:
+        self.__view.release()
+        self.__map.close()
+        self.__file.close()
+
+    def get_names(self, kind: str = None) -> list:
+        return [name for name, entry in self.index.items() if kind is None or entry['kind'] == kind]
+
+    def get_image(self, name: str) -> Surface:
+        entry = self.index[name]
+        data = self.__view[entry['offset']:entry['offset'] + entry['size']]
+        return image.frombuffer(data, (entry['width'], entry['height']), 'RGBA')
+
+    def get_level(self, name: str) -> dict:
+        entry = self.index[name]
+        return marshal.loads(self.__view[entry['offset']:entry['offset'] + entry['size']])
+
+    def install(self) -> None:
+        """ Hand every sheet and level to `SpriteSheet` and `TiledParser` """
+        for name, entry in self.index.items():
+            if entry['kind'] == 'image':
+                SpriteSheet.cache[name] = self.get_image(name)
+            elif entry['kind'] == 'level':
+                TiledParser.cache[name] = self.get_level(name)
+
+
+def open_pack(filename: str = PACK_FILE, names: list = IMAGES + LEVELS) -> AssetPack:
+    """ The pack, or None when it was built by another version or is older than its sources """
+    try:
+        pack = AssetPack(filename)
+    except ValueError as e:
+        logger.warning('%s, loading the sources', e)
+        return None
+    if not pack.is_current(names):
+        logger.warning('%s is out of date, loading the sources; rebuild it with pack.py', filename)
+        pack.close()
+        return None
+    return pack
+
+
+if __name__ == '__main__':
+    target = sys.argv[1] if len(sys.argv) > 1 else PACK_FILE
+    for name, entry in build_pack(target, IMAGES, LEVELS).items():
+        print('%-6s %-44s %8d bytes' % (entry['kind'], name, entry['size']))
@@ -0,0 +1,167 @@
+from __future__ import annotations
+import os
+import queue
+import subprocess
+import threading
+from pygame import Surface, image
+
+
+def pixel_order(surface: Surface) -> str:
+    """
+    Byte order of a 32 bit surface as channel letters, e.g. 'BGRX'.
+    X marks the padding byte of surfaces without alpha.
+    """
+    if surface.get_bytesize() != 4:
+        raise ValueError("Only 32 bit surfaces can be recorded.")
+    r, g, b, a = surface.get_masks()
+    channels = [('R', r), ('G', g), ('B', b), ('A' if a else 'X', a or ~(r | g | b) & 0xffffffff)]
+    return ''.join(name for name, mask in sorted(channels, key=lambda c: c[1]))
+
+
+class FrameWriter(object):
+    """
+    Consumes raw frames on the recorder worker thread.
+    """
+    def __init__(self):
+        raise RuntimeError("Can not instatiate")
+
+    def open(self, size: tuple, pitch: int, masks: tuple) -> None:
+        raise NotImplementedError("Implement `open` method.")
+
+    def write(self, number: int, data: memoryview) -> None:
+        raise NotImplementedError("Implement `write` method.")
+
+    def close(self) -> None:
+        raise NotImplementedError("Implement `close` method.")
+
+
+class PngSequenceWriter(FrameWriter):
+    def __init__(self, directory: str, pattern: str = 'frame%06d.png'):
+        self.directory = directory
+        self.pattern = pattern
+        self.__surface: Surface = None
+
+    def open(self, size: tuple, pitch: int, masks: tuple) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        """ Worker side surface with the pixel layout of the back buffer """
+        self.__surface = Surface(size, 0, 32, masks)
+
+    def write(self, number: int, data: memoryview) -> None:
+        self.__surface.get_buffer().write(data.tobytes())
+        image.save(self.__surface, os.path.join(self.directory, self.pattern % number))
+
+    def close(self) -> None:
+        self.__surface = None
+
+
+class PipeWriter(FrameWriter):
+    """
+    Streams raw frames to a file object or to the stdin of `command`,
+    e.g. the list returned by `ffmpeg_command`.
+    """
+    def __init__(self, command: list = None, stream: object = None):
+        self.command = command
+        self.__stream = stream
+        self.__process: subprocess.Popen = None
+
+    def open(self, size: tuple, pitch: int, masks: tuple) -> None:
+        if self.command is not None:
+            self.__process = subprocess.Popen(self.command, stdin=subprocess.PIPE)
+            self.__stream = self.__process.stdin
+
+    def write(self, number: int, data: memoryview) -> None:
+        self.__stream.write(data)
+
+    def close(self) -> None:
+        if self.__process is not None:
+            self.__process.stdin.close()
+            self.__process.wait()
+            self.__process = None
+        elif self.__stream is not None:
+            self.__stream.flush()
+
+
+def ffmpeg_command(output: str, surface: Surface, fps: int) -> list:
+    """ Encoder command line reading frames in the surface's own layout """
+    width, height = surface.get_size()
+    return [
+        'ffmpeg', '-loglevel', 'error', '-y',
+        '-f', 'rawvideo', '-pix_fmt', pixel_order(surface).lower().replace('x', '0'),
+        '-s', '%dx%d' % (width, height), '-r', str(fps),
+        '-i', '-', '-pix_fmt', 'yuv420p', output
+    ]
+
+
+class Recorder(object):
+    """
+    Copies rendered frames into a ring of preallocated buffers and hands
+    them to a worker thread running the `FrameWriter`.
+    `capture` never blocks: when every buffer is waiting on the worker the
+    frame is dropped and counted in `dropped`.
+    """
+    def __init__(self, writer: FrameWriter, buffers: int = 8):
+        self.writer = writer
+        self.buffers = buffers
+        self.captured = 0
+        self.dropped = 0
+        self.__slots: list = []
+        self.__free: queue.Queue = None
+        self.__filled: queue.Queue = None
+        self.__worker: threading.Thread = None
+        self.__error: Exception = None
+
+    def start(self, surface: Surface) -> None:
+        size = surface.get_pitch() * surface.get_height()
+        self.__slots = [bytearray(size) for i in range(self.buffers)]
+        self.__free = queue.Queue()
+        self.__filled = queue.Queue()
+        for i in range(self.buffers):
+            self.__free.put(i)
+        self.captured = 0
+        self.dropped = 0
+        self.writer.open(surface.get_size(), surface.get_pitch(), surface.get_masks())
+        self.__worker = threading.Thread(target=self.__run, name='recorder', daemon=True)
+        self.__worker.start()
+
+    def is_recording(self) -> bool:
+        return self.__worker is not None
+
+    def capture(self, surface: Surface) -> None:
+        if self.__worker is None:
+            return
+        try:
+            index = self.__free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return
+        memoryview(self.__slots[index])[:] = surface.get_view('0')
+        self.__filled.put((index, self.captured))
+        self.captured += 1
+
+    def stop(self) -> None:
+        """ Flush queued frames and close the writer """
+        if self.__worker is None:
+            return
+        self.__filled.put(None)
+        self.__worker.join()
+        self.__worker = None
+        if self.__error is not None:
+            error, self.__error = self.__error, None
+            raise error
+
+    def __run(self) -> None:
+        try:
+            while True:
+                item = self.__filled.get()
+                if item is None:
+                    break
+                index, number = item
+                try:
+                    if self.__error is None:
+                        self.writer.write(number, memoryview(self.__slots[index]))
+                except Exception as e:
+                    """ Keep releasing buffers so the game loop only drops frames """
+                    self.__error = e
+                self.__free.put(index)
+        finally:
+            self.writer.close()
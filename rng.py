@@ -0,0 +1,47 @@
+from random import Random, SystemRandom
+from snapshot import StateWriter, StateReader, save_random, load_random
+
+
+class RandomService(object):
+    """
+    Game wide source of randomness split in named streams.
+    Each stream is its own generator seeded from the game seed and its
+    name, so drawing more from one, e.g. steering, leaves the sequence of
+    the others unchanged. Components receive the stream they use instead
+    of calling the `random` module.
+    """
+    STARS = 'stars'
+    AI = 'ai'
+    STEERING = 'steering'
+    STREAMS = (STARS, AI, STEERING)
+
+    def __init__(self, seed: int = None, streams: tuple = STREAMS):
+        self.__streams = {name: Random() for name in streams}
+        self.seed(seed)
+
+    def seed(self, seed: int = None) -> None:
+        """ Reseed every stream, a random seed is drawn when None """
+        if seed is None:
+            seed = SystemRandom().getrandbits(63)
+        self.seed_value = seed
+        for name, stream in self.__streams.items():
+            stream.seed('%d:%s' % (seed, name))
+
+    def get(self, name: str) -> Random:
+        return self.__streams[name]
+
+    def getstate(self) -> tuple:
+        """ State of every stream, cheap enough to take every frame """
+        return tuple(stream.getstate() for stream in self.__streams.values())
+
+    def setstate(self, state: tuple) -> None:
+        for stream, value in zip(self.__streams.values(), state):
+            stream.setstate(value)
+
+    def save(self, writer: StateWriter) -> None:
+        for stream in self.__streams.values():
+            save_random(writer, stream)
+
+    def load(self, reader: StateReader) -> None:
+        for stream in self.__streams.values():
+            load_random(reader, stream)
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from pacer import FramePacer
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundJob(object):
+    """
+    A coroutine sharing the idle time between frames with the other jobs.
+    Await `checkpoint` between units of work: it yields to the frame and
+    the other jobs, and once `budget` milliseconds of this frame are spent
+    or the idle time is over, resumes in the idle time of the next frame.
+    A single unit longer than the idle time delays the frame, it counts as
+    an overrun.
+    """
+    def __init__(self, scheduler: 'FrameScheduler', name: str, budget: float):
+        self.name = name
+        self.budget = budget
+        self.task: asyncio.Task = None
+        self.frames = 0
+        self.used = 0.0
+        self.overruns = 0
+        self.__scheduler = scheduler
+        self.__frame = -1
+        self.__spent = 0.0
+        self.__resumed = time.perf_counter()
+
+    async def checkpoint(self) -> None:
+        now = self.__account()
+        scheduler = self.__scheduler
+        if self.__frame != scheduler.frame:
+            """ A frame ran since the last checkpoint, its idle time is a new allowance """
+            self.__close()
+            if now < scheduler.window_end:
+                self.__open()
+        if self.__frame == scheduler.frame and self.__spent < self.budget and now < scheduler.window_end:
+            await asyncio.sleep(0)
+        else:
+            await self.next_frame()
+        self.__resumed = time.perf_counter()
+
+    async def next_frame(self) -> None:
+        """ Give up the rest of this frame, e.g. when there is nothing to do """
+        self.__account()
+        self.__close()
+        await self.__scheduler.idle()
+        self.__open()
+        self.__resumed = time.perf_counter()
+
+    def stats(self) -> dict:
+        return {
+            'frames': self.frames,
+            'used': self.used,
+            'mean': self.used / self.frames if self.frames else 0.0,
+            'overruns': self.overruns
+        }
+
+    def __account(self) -> float:
+        """ Charge the work since the job last resumed, returns the time now """
+        now = time.perf_counter()
+        self.__spent += (now - self.__resumed) * 1000
+        self.overruns += self.__resumed <= self.__scheduler.deadline < now
+        self.__resumed = now
+        return now
+
+    def __open(self) -> None:
+        self.__frame = self.__scheduler.frame
+        self.__spent = 0.0
+        self.frames += 1
+
+    def __close(self) -> None:
+        if self.__frame >= 0:
+            self.used += self.__spent
+        self.__frame = -1
+        self.__spent = 0.0
+
+
+class FrameScheduler(object):
+    """
+    Runs frames at the deadlines of a pacer from an asyncio loop.
+    After each frame the idle time opens: background jobs run until `spin`
+    milliseconds before the next deadline, the frame task sleeps meanwhile
+    and spins out the rest, so frames start on time as long as every unit
+    of job work is short. Jobs are added with `add_job` from the running
+    loop and cancelled when `run` returns.
+    """
+    def __init__(self, spin: float = 1.0):
+        self.spin = spin
+        """ Frames run so far, perf_counter values the current idle time and frame end at """
+        self.frame = 0
+        self.window_end = 0.0
+        self.deadline = 0.0
+        self.jobs: list = []
+        self.__window: asyncio.Future = None
+
+    def add_job(self, name: str, function, budget: float) -> BackgroundJob:
+        """ Start `function(job)`, a coroutine function, as a job of `budget` ms per frame """
+        job = BackgroundJob(self, name, budget)
+        job.task = asyncio.get_running_loop().create_task(function(job), name=name)
+        job.task.add_done_callback(self.__finished)
+        self.jobs.append(job)
+        return job
+
+    def idle(self) -> asyncio.Future:
+        """ Resolves when the idle time after the next frame starts """
+        if self.__window is None:
+            self.__window = asyncio.get_running_loop().create_future()
+        return self.__window
+
+    async def run(self, pacer: FramePacer, frame, running) -> None:
+        """ Call `frame(milliseconds)` every frame while `running()` """
+        try:
+            while running():
+                frame(pacer.tick())
+                self.deadline = pacer.get_deadline()
+                self.frame += 1
+                self.window_end = self.deadline - self.spin / 1000
+                window = self.idle()
+                self.__window = None
+                window.set_result(None)
+                await self.__sleep_until(self.deadline)
+        finally:
+            await self.__cancel()
+
+    async def __sleep_until(self, deadline: float) -> None:
+        remaining = self.window_end - time.perf_counter()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+        while time.perf_counter() < deadline:
+            pass
+
+    async def __cancel(self) -> None:
+        tasks = [job.task for job in self.jobs]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in self.jobs:
+            stats = job.stats()
+            logger.info('job %s: %d frames, %.2f ms/frame of %.2f ms, %d overruns',
+                        job.name, stats['frames'], stats['mean'], job.budget, stats['overruns'])
+
+    def __finished(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error('job %s failed', task.get_name(), exc_info=task.exception())
@@ -0,0 +1,64 @@
+import struct
+from random import Random
+
+MAGIC = b'GLGS'
+VERSION = 4
+""" Words in the Mersenne Twister state of `random.Random` """
+RANDOM_WORDS = 625
+
+""" Compiled formats, all little endian and unaligned """
+_structs: dict = {}
+
+
+def get_struct(fmt: str) -> struct.Struct:
+    compiled = _structs.get(fmt)
+    if compiled is None:
+        compiled = struct.Struct('<' + fmt)
+        _structs[fmt] = compiled
+    return compiled
+
+
+class StateWriter(object):
+    """
+    Collects values with their struct format and packs them in one call.
+    """
+    def __init__(self):
+        self.__format: list = ['4sH']
+        self.__values: list = [MAGIC, VERSION]
+
+    def write(self, fmt: str, *values) -> None:
+        self.__format.append(fmt)
+        self.__values.extend(values)
+
+    def getvalue(self) -> bytes:
+        return struct.pack('<' + ''.join(self.__format), *self.__values)
+
+
+class StateReader(object):
+    """
+    Reads values back in the order they were written.
+    """
+    def __init__(self, data: bytes):
+        self.__data = data
+        self.__offset = 0
+        magic, version = self.read('4sH')
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Unsupported snapshot format.")
+
+    def read(self, fmt: str) -> tuple:
+        compiled = get_struct(fmt)
+        values = compiled.unpack_from(self.__data, self.__offset)
+        self.__offset += compiled.size
+        return values
+
+
+def save_random(writer: StateWriter, generator: Random) -> None:
+    version, internal, gauss = generator.getstate()
+    writer.write('i%dIBd' % RANDOM_WORDS, version, *internal, gauss is not None, gauss or 0.0)
+
+
+def load_random(reader: StateReader, generator: Random) -> None:
+    version, = reader.read('i')
+    values = reader.read('%dIBd' % RANDOM_WORDS)
+    gauss = values[-1] if values[-2] else None
+    generator.setstate((version, values[:-2], gauss))
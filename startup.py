@@ -0,0 +1,140 @@
+from __future__ import annotations
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from importlib.abc import MetaPathFinder
+
+
+class StartupTracer(object):
+    """
+    Records how long each startup step takes: module imports, asset loads
+    and named phases, then prints a breakdown.
+    Records are (category, name, offset, duration, depth, thread) with
+    times in seconds since the tracer was created.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.__records: list = []
+        self.__lock = threading.Lock()
+        self.__depth = 0
+        self.__hook: ImportTimer = None
+
+    def record(self, category: str, name: str, started: float, duration: float, depth: int = 0) -> None:
+        with self.__lock:
+            self.__records.append(
+                (category, name, started - self.start, duration, depth, threading.current_thread().name)
+            )
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        self.__depth += 1
+        try:
+            yield
+        finally:
+            self.__depth -= 1
+            self.record('phase', name, started, time.perf_counter() - started, self.__depth)
+
+    def mark(self, name: str) -> float:
+        """ Record a point in time, e.g. the first presented frame """
+        now = time.perf_counter()
+        self.record('mark', name, now, 0.0)
+        return now - self.start
+
+    def trace_imports(self) -> None:
+        if self.__hook is None:
+            self.__hook = ImportTimer(self)
+            sys.meta_path.insert(0, self.__hook)
+
+    def stop_imports(self) -> None:
+        if self.__hook is not None:
+            sys.meta_path.remove(self.__hook)
+            self.__hook = None
+
+    def get_records(self) -> list:
+        with self.__lock:
+            return sorted(self.__records, key=lambda r: r[2])
+
+    def report(self, out=sys.stdout) -> None:
+        records = self.get_records()
+        out.write('%-8s %-44s %9s %9s  %s\n' % ('kind', 'name', 'at ms', 'took ms', 'thread'))
+        for category, name, offset, duration, depth, thread in records:
+            label = ('  ' * depth + name)[:44]
+            out.write('%-8s %-44s %9.2f %9.2f  %s\n' % (category, label, offset * 1000, duration * 1000, thread))
+        totals: dict = {}
+        for category, name, offset, duration, depth, thread in records:
+            if depth == 0:
+                totals[category] = totals.get(category, 0.0) + duration
+        for category, total in totals.items():
+            out.write('total %-12s %9.2f ms\n' % (category, total * 1000))
+
+
+class TimedLoader(object):
+    """
+    Wraps a module loader and times `create_module` plus `exec_module`,
+    extension modules do most of their work in the former.
+    """
+    def __init__(self, loader: object, name: str, timer: ImportTimer):
+        self.__loader = loader
+        self.__name = name
+        self.__timer = timer
+        self.__started: float = None
+
+    def create_module(self, spec: object) -> object:
+        self.__started = time.perf_counter()
+        return self.__loader.create_module(spec)
+
+    def exec_module(self, module: object) -> None:
+        self.__timer.enter()
+        started = self.__started or time.perf_counter()
+        try:
+            self.__loader.exec_module(module)
+        finally:
+            self.__timer.leave(self.__name, started)
+
+    def __getattr__(self, name: str) -> object:
+        return getattr(self.__loader, name)
+
+
+class ImportTimer(MetaPathFinder):
+    """
+    Meta path entry that asks the other finders for the spec and wraps its
+    loader, so every import executed while installed is timed, nested
+    imports included.
+    """
+    def __init__(self, tracer: StartupTracer):
+        self.__tracer = tracer
+        self.__depth = 0
+        self.__local = threading.local()
+
+    def find_spec(self, fullname: str, path: object, target: object = None) -> object:
+        if getattr(self.__local, 'busy', False):
+            return None
+        self.__local.busy = True
+        try:
+            spec = None
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+        finally:
+            self.__local.busy = False
+        if spec is None or spec.loader is None or not hasattr(spec.loader, 'exec_module'):
+            return spec
+        spec.loader = TimedLoader(spec.loader, fullname, self)
+        return spec
+
+    def enter(self) -> None:
+        self.__depth += 1
+
+    def leave(self, name: str, started: float) -> None:
+        self.__depth -= 1
+        self.__tracer.record('import', name, started, time.perf_counter() - started, self.__depth)
+
+
+""" Process wide tracer, importing this module first starts import timing """
+tracer = StartupTracer()
+tracer.trace_imports()
@@ -0,0 +1,230 @@
+from multiprocessing import Pipe, get_context
+from multiprocessing.process import BaseProcess
+from multiprocessing.shared_memory import SharedMemory
+import numpy
+from enemies import EnemyGroup, IndexedSet
+from enemy_behaviour import HomeBehaviour, DiveBehaviour, ReturnBehaviour
+from rng import RandomService
+
+
+class SwarmBuffers(object):
+    """
+    Numpy views over the shared block.
+    Two buffers of (x, y, vx, vy) rows, behaviour kinds and shot flags,
+    tick t is written to buffer t % 2. `alive` is written by the main
+    process and read by the worker only when deciding a tick.
+    """
+    def __init__(self, buf: memoryview, count: int):
+        self.buffers: list = []
+        offset = 0
+        for i in range(2):
+            state = numpy.ndarray((count, 4), numpy.float64, buf, offset)
+            offset += state.nbytes
+            kinds = numpy.ndarray(count, numpy.int8, buf, offset)
+            offset += count
+            shots = numpy.ndarray(count, numpy.int8, buf, offset)
+            offset += count
+            self.buffers.append((state, kinds, shots))
+        self.alive = numpy.ndarray(count, numpy.int8, buf, offset)
+
+    @staticmethod
+    def size(count: int) -> int:
+        return 2 * (count * 4 * 8 + count * 2) + count
+
+    def get(self, tick: int) -> tuple:
+        return self.buffers[tick % 2]
+
+
+class SwarmModel(object):
+    """
+    The enemy swarm without sprites: behaviours, steering and the dive and
+    shoot schedule of `EnemyGroup`, driven by the same seeded streams so a
+    fresh `RandomService(seed)` replays the in-process swarm.
+    """
+    def __init__(self, initial: list, seed: int):
+        rng = RandomService(seed)
+        self.__ai = rng.get(RandomService.AI)
+        steering = rng.get(RandomService.STEERING)
+        self.initial = initial
+        self.behaviours: list = [HomeBehaviour((0, -20), pos, steering) for pos in initial]
+        self.velocities: list = [(0.0, 0.0)] * len(initial)
+        self.shots: list = [0] * len(initial)
+        self.__alive: list = [True] * len(initial)
+        self.__home = IndexedSet()
+        self.__diving = IndexedSet()
+        self.__returning = IndexedSet()
+        self.__formation = {
+            HomeBehaviour.KIND: self.__home,
+            DiveBehaviour.KIND: self.__diving,
+            ReturnBehaviour.KIND: self.__returning
+        }
+        self.__shoot_counter = 0
+        self.__dive_counter = 0
+        for index in range(len(initial)):
+            self.__home.add(index)
+
+    def move(self) -> None:
+        """
+        Advance the behaviours of the enemies alive so far. Steering does
+        not depend on the frame time nor draw random numbers, so it can
+        run before the frame's kills are known.
+        """
+        for index, behaviour in enumerate(self.behaviours):
+            if self.__alive[index]:
+                behaviour.update(0)
+
+    def decide(self, time: int, alive: list) -> None:
+        """
+        Apply the frame's kills, then behaviour changes, dives and shots,
+        in the order `EnemyGroup.update` makes them in process.
+        """
+        for index, flag in enumerate(alive):
+            if not flag and self.__alive[index]:
+                self.__alive[index] = False
+                self.__formation[self.behaviours[index].KIND].remove(index)
+        self.shots = [0] * len(self.behaviours)
+        for index, behaviour in enumerate(self.behaviours):
+            if not self.__alive[index]:
+                continue
+            vel = behaviour.steer.vel
+            self.velocities[index] = (vel.x, vel.y)
+            if behaviour.is_completed():
+                following = behaviour.next()
+                if following is not behaviour:
+                    self.__set(index, following)
+        self.__dive(time)
+        self.__shoot(time)
+
+    def write(self, state: numpy.ndarray, kinds: numpy.ndarray, shots: numpy.ndarray) -> None:
+        state[:] = [
+            (b.steer.pos.x, b.steer.pos.y, v[0], v[1]) for b, v in zip(self.behaviours, self.velocities)
+        ]
+        kinds[:] = [b.KIND for b in self.behaviours]
+        shots[:] = self.shots
+
+    def __set(self, index: int, behaviour: object) -> None:
+        self.__formation[self.behaviours[index].KIND].remove(index)
+        self.behaviours[index] = behaviour
+        self.__formation[behaviour.KIND].add(index)
+
+    def __dive(self, time: int) -> None:
+        home = self.__home
+        if len(home) == 0:
+            return
+        self.__dive_counter += time
+        if self.__dive_counter > EnemyGroup.DIVE_TIME:
+            self.__dive_counter = 0
+            chosen = [home[i] for i in {self.__ai.randint(0, len(home) - 1) for i in range(2)}]
+            for index in chosen:
+                b = self.behaviours[index]
+                target = (self.__ai.randint(32, 368), 330)
+                self.__set(index, DiveBehaviour(b.steer.pos, target, self.initial[index], b.steer.rng))
+
+    def __shoot(self, time: int) -> None:
+        diving = self.__diving
+        returning = self.__returning
+        total = len(diving) + len(returning)
+        if total == 0:
+            return
+        self.__shoot_counter += time
+        if self.__shoot_counter > EnemyGroup.SHOOT_TIME:
+            self.__shoot_counter = 0
+            for i in {self.__ai.randint(0, total - 1) for i in range(4)}:
+                index = diving[i] if i < len(diving) else returning[i - len(diving)]
+                self.shots[index] = 1
+
+
+""" Message starting the movement of the next tick """
+MOVE = 'move'
+
+
+def run_worker(name: str, initial: list, seed: int, conn: object) -> None:
+    """
+    Worker process: `MOVE` moves the swarm, a (tick, time) message decides
+    the tick and answers with it once written, None stops.
+    """
+    memory = SharedMemory(name=name)
+    buffers = SwarmBuffers(memory.buf, len(initial))
+    try:
+        model = SwarmModel(initial, seed)
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            if message == MOVE:
+                model.move()
+                continue
+            tick, time = message
+            model.decide(time, buffers.alive.tolist())
+            model.write(*buffers.get(tick))
+            conn.send(tick)
+    finally:
+        del buffers
+        memory.close()
+
+
+class SwarmClient(object):
+    """
+    Main process side of the swarm worker.
+
+    A tick has two halves. `advance` starts moving the swarm, which the
+    worker does while the main process finishes its frame. In the next
+    frame, once the kills are known, `alive` is written, `submit` starts
+    the behaviour changes, dives and shots of the tick and `sync` waits
+    for them and returns the tick's buffer. `start` moves the first tick.
+    The worker is spawned, so scripts starting it need a `__main__` guard.
+    """
+    def __init__(self, initial: list, seed: int):
+        self.initial = initial
+        self.seed = seed
+        self.alive: numpy.ndarray = None
+        self.__memory: SharedMemory = None
+        self.__buffers: SwarmBuffers = None
+        self.__process: BaseProcess = None
+        self.__conn = None
+        self.__tick = 0
+        self.__pending = False
+
+    def start(self) -> None:
+        count = len(self.initial)
+        self.__memory = SharedMemory(create=True, size=SwarmBuffers.size(count))
+        self.__buffers = SwarmBuffers(self.__memory.buf, count)
+        self.alive = self.__buffers.alive
+        self.alive[:] = 1
+        self.__conn, child = Pipe()
+        """ Forking a process with SDL and live threads is not safe, spawn a fresh interpreter """
+        context = get_context('spawn')
+        self.__process = context.Process(target=run_worker, name='swarm', daemon=True,
+                                         args=(self.__memory.name, self.initial, self.seed, child))
+        self.__process.start()
+        self.advance()
+
+    def advance(self) -> None:
+        self.__conn.send(MOVE)
+
+    def is_pending(self) -> bool:
+        return self.__pending
+
+    def submit(self, time: int) -> None:
+        self.__tick += 1
+        self.__conn.send((self.__tick, time))
+        self.__pending = True
+
+    def sync(self) -> tuple:
+        """ (state, kinds, shots) of the last submitted tick """
+        tick = self.__conn.recv()
+        self.__pending = False
+        return self.__buffers.get(tick)
+
+    def close(self) -> None:
+        if self.__process is None:
+            return
+        if self.__pending:
+            self.sync()
+        self.__conn.send(None)
+        self.__process.join()
+        self.__process = None
+        self.alive = None
+        self.__buffers = None
+        self.__memory.close()
+        self.__memory.unlink()
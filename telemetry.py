@@ -0,0 +1,205 @@
+from __future__ import annotations
+import argparse
+import gc
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+
+""" Fields of a frame record, times in milliseconds """
+FIELDS = ('frame', 'at', 'frame_ms', 'update_ms', 'render_ms', 'present_ms',
+          'sprites', 'enemies', 'bullets', 'gc_ms', 'dropped', 'level', 'quality')
+
+
+class GcMonitor(object):
+    """
+    Sums the time spent in garbage collections through `gc.callbacks`.
+    `take` returns the pause time since the previous call.
+    """
+    def __init__(self):
+        self.__started = 0.0
+        self.__paused = 0.0
+
+    def install(self) -> None:
+        gc.callbacks.append(self.__callback)
+
+    def uninstall(self) -> None:
+        if self.__callback in gc.callbacks:
+            gc.callbacks.remove(self.__callback)
+
+    def take(self) -> float:
+        paused = self.__paused
+        self.__paused = 0.0
+        return paused
+
+    def __callback(self, phase: str, info: dict) -> None:
+        if phase == 'start':
+            self.__started = time.perf_counter()
+        else:
+            self.__paused += (time.perf_counter() - self.__started) * 1000
+
+
+class TelemetryLog(object):
+    """
+    Per frame metrics written as JSON lines.
+    `record` only appends a tuple; every `batch` frames the buffer is handed
+    to a writer thread that formats and writes it, so the game loop never
+    waits for the disk. Without the thread, `write_job` writes the batches
+    as a `BackgroundJob` of the asyncio loop instead. Frames longer than
+    half a budget over the target count the presentation intervals they
+    missed as dropped.
+    """
+    def __init__(self, filename: str, budget: float, batch: int = 120):
+        self.filename = filename
+        self.budget = budget
+        self.batch = batch
+        self.gc = GcMonitor()
+        self.__buffer: list = []
+        self.__queue: queue.Queue = queue.Queue()
+        self.__thread: threading.Thread = None
+        self.__count = 0
+        self.__start = 0.0
+
+    def start(self, thread: bool = True) -> None:
+        directory = os.path.dirname(self.filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.__start = time.perf_counter()
+        self.gc.install()
+        if thread:
+            self.__thread = threading.Thread(target=self.__run, name='telemetry', daemon=True)
+            self.__thread.start()
+
+    def record(self, frame_ms: float, update_ms: float, render_ms: float, present_ms: float,
+               sprites: int, enemies: int, bullets: int, level: str, quality: str = '') -> None:
+        dropped = max(0, round(frame_ms / self.budget) - 1) if frame_ms > self.budget * 1.5 else 0
+        self.__buffer.append((
+            self.__count, (time.perf_counter() - self.__start) * 1000, frame_ms, update_ms, render_ms,
+            present_ms, sprites, enemies, bullets, self.gc.take(), dropped, level, quality
+        ))
+        self.__count += 1
+        if len(self.__buffer) >= self.batch:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.__buffer:
+            self.__queue.put(self.__buffer)
+            self.__buffer = []
+
+    def stop(self) -> None:
+        self.gc.uninstall()
+        self.flush()
+        self.__queue.put(None)
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        else:
+            """ What the job did not get to """
+            self.__run()
+
+    async def write_job(self, job: object) -> None:
+        """ One batch per checkpoint, the job is cancelled before `stop` writes the rest """
+        with open(self.filename, 'a') as f:
+            while True:
+                await job.checkpoint()
+                try:
+                    records = self.__queue.get_nowait()
+                except queue.Empty:
+                    await job.next_frame()
+                    continue
+                self.__write(f, records)
+
+    def __run(self) -> None:
+        with open(self.filename, 'a') as f:
+            while True:
+                records = self.__queue.get()
+                if records is None:
+                    break
+                self.__write(f, records)
+
+    @staticmethod
+    def __write(f: object, records: list) -> None:
+        f.write(''.join(json.dumps(dict(zip(FIELDS, r))) + '\n' for r in records))
+        f.flush()
+
+
+def read_log(filename: str) -> list:
+    with open(filename) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: list, p: float) -> float:
+    """ Nearest rank percentile of sorted `values` """
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def find_jank(records: list, budget: float, threshold: float = 1.5) -> list:
+    """
+    Runs of consecutive frames slower than `threshold` budgets,
+    as (first frame, length, worst ms).
+    """
+    episodes: list = []
+    current = None
+    for record in records:
+        if record['frame_ms'] > budget * threshold:
+            if current is None:
+                current = [record['frame'], 0, 0.0]
+            current[1] += 1
+            current[2] = max(current[2], record['frame_ms'])
+        elif current is not None:
+            episodes.append(tuple(current))
+            current = None
+    if current is not None:
+        episodes.append(tuple(current))
+    return episodes
+
+
+def summarize(records: list) -> dict:
+    frames = sorted(r['frame_ms'] for r in records)
+    count = len(records) or 1
+    return {
+        'frames': len(records),
+        'degraded': sum(1 for r in records if r.get('quality') not in (None, '', 'full')),
+        'p50': percentile(frames, 50),
+        'p90': percentile(frames, 90),
+        'p99': percentile(frames, 99),
+        'max': frames[-1] if frames else 0.0,
+        'update': sum(r['update_ms'] for r in records) / count,
+        'render': sum(r['render_ms'] for r in records) / count,
+        'present': sum(r['present_ms'] for r in records) / count,
+        'gc': sum(r['gc_ms'] for r in records),
+        'dropped': sum(r['dropped'] for r in records),
+    }
+
+
+def report(records: list, budget: float, out=sys.stdout) -> None:
+    row = '%-32s %7s %7s %7s %7s %7s %7s %7s %7s %9s %7s %8s\n'
+    out.write(row % ('level', 'frames', 'p50', 'p90', 'p99', 'max',
+                     'update', 'render', 'present', 'gc total', 'dropped', 'degraded'))
+    levels: dict = {}
+    for record in records:
+        levels.setdefault(record['level'], []).append(record)
+    for name, group in list(levels.items()) + [('all', records)]:
+        s = summarize(group)
+        out.write('%-32s %7d %7.2f %7.2f %7.2f %7.2f %7.2f %7.2f %7.2f %9.2f %7d %8d\n' % (
+            name[-32:], s['frames'], s['p50'], s['p90'], s['p99'], s['max'],
+            s['update'], s['render'], s['present'], s['gc'], s['dropped'], s['degraded']))
+    episodes = find_jank(records, budget)
+    out.write('%d jank episodes over %.1f ms\n' % (len(episodes), budget * 1.5))
+    for first, length, worst in sorted(episodes, key=lambda e: -e[2])[:10]:
+        out.write('  frame %7d  %4d frames  worst %7.2f ms\n' % (first, length, worst))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Frame time report of telemetry logs.')
+    parser.add_argument('logs', nargs='+')
+    parser.add_argument('--fps', type=float, default=30)
+    args = parser.parse_args()
+    for log in args.logs:
+        sys.stdout.write('%s\n' % log)
+        report(read_log(log), 1000 / args.fps)
@@ -1,6 +1,10 @@
 import json
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
 from pygame import Rect
 from typing import Optional
+from tmx import read_tmx
 
 
 class TileItem(object):
@@ -20,38 +24,79 @@ class TileItem(object):
 
 
 class TileLayer(object):
+    """
+    Tile ids packed row by row in an `array('I')`, 0 for empty cells.
+    Cell and point lookups index the array directly and region queries
+    only visit the cells under the region. `TileItem`s are created the
+    first time a cell is asked for and kept until the cell changes.
+    """
     def __init__(self, name: str, config: dict, tile: Rect):
-        self.__items: list = []
-        self.width = int(config['width'] * tile.width)
-        self.height = int(config['height'] * tile.height)
+        self.cols = int(config['width'])
+        self.rows = int(config['height'])
+        self.width = int(self.cols * tile.width)
+        self.height = int(self.rows * tile.height)
         self.__name: str = name
-        self.__properties: str = self.__parse_type(config['properties'])
-        x: int = 0
-        y: int = 0
-        index: int = 0
-        for item in config['data']:
-            if item != 0:
-                index += 1
-                rect = Rect(x * tile.width,
-                            y * tile.height,
-                            tile.width,
-                            tile.height)
-                self.__items.append(
-                    TileItem(rect, item, self.get_type())
-                )
-            x += 1
-            if x > config['width'] - 1:
-                x = 0
-                y += 1
+        self.__tile: Rect = tile
+        self.__properties: dict = self.__parse_type(config['properties'])
+        self.__grid = array('I', config['data'])
+        """ TileItems by cell index, created on demand """
+        self.__cells: dict = {}
+        self.__items: list = None
 
     def get_name(self) -> str:
         return self.__name
 
     def get_items(self) -> list:
+        """ Every tile, row by row """
+        if self.__items is None:
+            grid = self.__grid
+            self.__items = [self.__get_item(index) for index in range(len(grid)) if grid[index] != 0]
         return self.__items
 
     def get_items_index(self, index: int) -> TileItem:
-        return self.__items[index]
+        return self.get_items()[index]
+
+    def get_items_in(self, area: Rect) -> list:
+        items: list = []
+        grid = self.__grid
+        first_col, first_row, last_col, last_row = self.__get_cells(area)
+        for row in range(first_row, last_row):
+            offset = row * self.cols
+            for index in range(offset + first_col, offset + last_col):
+                if grid[index] != 0:
+                    items.append(self.__get_item(index))
+        return items
+
+    def get_tile(self, col: int, row: int) -> int:
+        """ Tile id of a cell, 0 when empty or outside the layer """
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            return self.__grid[row * self.cols + col]
+        return 0
+
+    def get_tile_at(self, x: int, y: int) -> int:
+        """ Tile id under a point in pixels """
+        return self.get_tile(x // self.__tile.width, y // self.__tile.height)
+
+    def get_item_at(self, x: int, y: int) -> Optional[TileItem]:
+        col = x // self.__tile.width
+        row = y // self.__tile.height
+        if self.get_tile(col, row) == 0:
+            return None
+        return self.__get_item(row * self.cols + col)
+
+    def get_tile_size(self) -> tuple:
+        return self.__tile.size
+
+    def set_tile(self, col: int, row: int, id: int) -> Rect:
+        """
+        Replace the tile at the given cell, 0 removes it.
+        Returns the area that changed.
+        """
+        index = row * self.cols + col
+        self.__grid[index] = id
+        self.__cells.pop(index, None)
+        self.__items = None
+        return Rect(col * self.__tile.width, row * self.__tile.height, self.__tile.width, self.__tile.height)
 
     def get_type(self) -> str:
         return self.__properties.get('tile_type')
@@ -62,6 +107,152 @@ class TileLayer(object):
     def get_properties(self) -> dict:
         return self.__properties
 
+    def __get_item(self, index: int) -> TileItem:
+        item = self.__cells.get(index)
+        if item is None:
+            width, height = self.__tile.size
+            rect = Rect(index % self.cols * width, index // self.cols * height, width, height)
+            item = TileItem(rect, self.__grid[index], self.get_type())
+            self.__cells[index] = item
+        return item
+
+    def __get_cells(self, area: Rect) -> tuple:
+        """ Column and row range covered by `area`, clipped to the layer """
+        width, height = self.__tile.size
+        return (max(0, area.left // width), max(0, area.top // height),
+                min(self.cols, (area.right + width - 1) // width), min(self.rows, (area.bottom + height - 1) // height))
+
+    def __parse_type(self, properties: list) -> dict:
+        props = {}
+        for i in properties:
+            props[i.get('name')] = i.get('value')
+        return props
+
+
+class TileChunk(object):
+    """
+    Metadata of one chunk of an infinite layer, in tiles.
+    `data` holds the undecoded gids until the layer needs the chunk.
+    """
+    def __init__(self, config: dict, tile: Rect):
+        self.col = config['x']
+        self.row = config['y']
+        self.cols = config['width']
+        self.rows = config['height']
+        self.data = config['data']
+        self.rect = Rect(self.col * tile.width, self.row * tile.height,
+                         self.cols * tile.width, self.rows * tile.height)
+
+
+class ChunkedTileLayer(object):
+    """
+    Tile layer of an infinite map, stored by Tiled as chunks.
+    Only chunk positions are read up front. A chunk is decoded into
+    `TileItem`s the first time an area overlapping it is asked for, and
+    at most `capacity` decoded chunks are kept; the least recently used
+    one is dropped first, so memory does not grow with the map.
+    """
+    CAPACITY = 16
+
+    def __init__(self, name: str, config: dict, tile: Rect, capacity: int = CAPACITY):
+        self.__name: str = name
+        self.__tile: Rect = tile
+        self.__properties: dict = self.__parse_type(config.get('properties', []))
+        """ Sorted by top edge, found by bisection on `__tops` """
+        self.__chunks: list = sorted((TileChunk(chunk, tile) for chunk in config['chunks']),
+                                     key=lambda chunk: chunk.rect.top)
+        self.__tops: list = [chunk.rect.top for chunk in self.__chunks]
+        self.__tallest = max([chunk.rect.height for chunk in self.__chunks], default=0)
+        self.__decoded: OrderedDict = OrderedDict()
+        self.capacity = capacity
+        self.bounds = Rect(config['startx'] * tile.width, config['starty'] * tile.height,
+                           config['width'] * tile.width, config['height'] * tile.height)
+        self.width = self.bounds.right
+        self.height = self.bounds.bottom
+
+    def get_name(self) -> str:
+        return self.__name
+
+    def get_items(self) -> list:
+        """ Items of the chunks decoded at the moment """
+        return [item for items in self.__decoded.values() for item in items]
+
+    def get_items_in(self, area: Rect) -> list:
+        items: list = []
+        for index in self.__find(area):
+            items.extend(item for item in self.__load(index) if item.get_rect().colliderect(area))
+        return items
+
+    def get_items_index(self, index: int) -> TileItem:
+        return self.get_items()[index]
+
+    def stream(self, area: Rect) -> None:
+        """ Decode the chunks overlapping `area` ahead of use """
+        for index in self.__find(area):
+            self.__load(index)
+
+    def get_decoded_count(self) -> int:
+        return len(self.__decoded)
+
+    def get_tile_size(self) -> tuple:
+        return self.__tile.size
+
+    def set_tile(self, col: int, row: int, id: int) -> Rect:
+        """
+        Replace the tile at the given cell, 0 removes it.
+        The change is kept in the chunk data, so it survives eviction.
+        Returns the area that changed.
+        """
+        rect = Rect(col * self.__tile.width, row * self.__tile.height, self.__tile.width, self.__tile.height)
+        for index in self.__find(rect):
+            chunk = self.__chunks[index]
+            if chunk.rect.contains(rect):
+                chunk.data = list(chunk.data)
+                chunk.data[(row - chunk.row) * chunk.cols + col - chunk.col] = id
+                self.__decoded.pop(index, None)
+                return rect
+        raise ValueError("No chunk holds tile (%d, %d)." % (col, row))
+
+    def get_type(self) -> str:
+        return self.__properties.get('tile_type')
+
+    def is_actor(self) -> bool:
+        return self.__properties.get('is_actor')
+
+    def get_properties(self) -> dict:
+        return self.__properties
+
+    def __find(self, area: Rect) -> list:
+        """ Indexes of the chunks overlapping `area` """
+        found = []
+        index = bisect_left(self.__tops, area.top - self.__tallest + 1)
+        while index < len(self.__chunks) and self.__tops[index] < area.bottom:
+            if self.__chunks[index].rect.colliderect(area):
+                found.append(index)
+            index += 1
+        return found
+
+    def __load(self, index: int) -> list:
+        items = self.__decoded.get(index)
+        if items is not None:
+            self.__decoded.move_to_end(index)
+            return items
+        items = self.__decode(self.__chunks[index])
+        self.__decoded[index] = items
+        while len(self.__decoded) > self.capacity:
+            self.__decoded.popitem(last=False)
+        return items
+
+    def __decode(self, chunk: TileChunk) -> list:
+        items: list = []
+        width, height = self.__tile.size
+        for i, gid in enumerate(chunk.data):
+            if gid != 0:
+                rect = Rect((chunk.col + i % chunk.cols) * width, (chunk.row + i // chunk.cols) * height,
+                            width, height)
+                items.append(TileItem(rect, gid, self.get_type()))
+        return items
+
     def __parse_type(self, properties: list) -> dict:
         props = {}
         for i in properties:
@@ -99,6 +290,7 @@ class Map(object):
         self.__layers = []
         self.__actor: TileLayer = None
         self.__enemies: list = []
+        self.__platforms: object = None
         self.__screen: Rect = None
 
     def build(self) -> None:
@@ -107,12 +299,18 @@ class Map(object):
                 self.__actor = layer
             if layer.is_actor() is False and layer.get_type() == 'character':
                 self.__enemies.append(layer)
+            if layer.get_name() == 'platform' and self.__platforms is None:
+                self.__platforms = layer
 
     def add_layer(self, layer: object) -> None:
         self.__layers.append(layer)
 
     def set_screen(self, screen: Rect) -> None:
+        """ Moving the screen streams in the chunks of infinite layers below it """
         self.__screen = screen
+        for layer in self.__layers:
+            if isinstance(layer, ChunkedTileLayer):
+                layer.stream(screen)
 
     def get_screen(self) -> Rect:
         return self.__screen
@@ -126,32 +324,61 @@ class Map(object):
     def get_enemies(self) -> list:
         return self.__enemies
 
+    def get_static_layers(self) -> list:
+        """ Tile layers with level art, everything but character layers """
+        return [
+            layer for layer in self.__layers
+            if isinstance(layer, (TileLayer, ChunkedTileLayer)) and layer.get_type() != 'character'
+        ]
+
     def get_platforms(self) -> list:
-        for layer in self.__layers:
-            if layer.get_name() == 'platform':
-                return layer.get_items()
-        return []
+        if self.__platforms is None:
+            return []
+        return self.__platforms.get_items()
 
     def get_rect(self) -> Rect:
         return Rect(0, 0, self.width, self.height)
 
 
+def load_level(file: str) -> dict:
+    """ Level dict from a TMX map or its JSON export """
+    if file.endswith('.tmx'):
+        return read_tmx(file)
+    with open(file) as f:
+        return json.load(f)
+
+
 class TiledParser(object):
+    """ Parsed level files by filename, filled by `AssetLoader` """
+    cache: dict = {}
+
     def __init__(self, file: str):
         self.layers = []
-        with open(file) as f:
-            data = json.load(f)
-        width = data['width'] * data['tilewidth']
-        height = data['height'] * data['tileheight']
-        self.__map = Map(width, height)
+        data = TiledParser.cache.get(file)
+        if data is None:
+            data = load_level(file)
         tile = Rect(0, 0, data['tilewidth'], data['tileheight'])
+        layers: list = []
         for layer in data['layers']:
             if layer['visible'] is False:
                 continue
-            if layer['type'] == 'tilelayer':
-                self.__map.add_layer(TileLayer(layer['name'], layer, tile))
+            if layer['type'] == 'tilelayer' and data.get('infinite'):
+                layers.append(ChunkedTileLayer(layer['name'], layer, tile))
+            elif layer['type'] == 'tilelayer':
+                layers.append(TileLayer(layer['name'], layer, tile))
             if layer['type'] == 'objectgroup':
-                self.__map.add_layer(ObjectGroup(layer))
+                layers.append(ObjectGroup(layer))
+        width = data['width'] * data['tilewidth']
+        height = data['height'] * data['tileheight']
+        if data.get('infinite'):
+            """ The header size of infinite maps is meaningless, use the chunk extent """
+            for layer in layers:
+                if isinstance(layer, ChunkedTileLayer):
+                    width = max(width, layer.width)
+                    height = max(height, layer.height)
+        self.__map = Map(width, height)
+        for layer in layers:
+            self.__map.add_layer(layer)
         self.__map.build()
 
     def get_map(self) -> Map:
@@ -0,0 +1,157 @@
+import base64
+import gzip
+import sys
+import zlib
+from array import array
+from xml.etree.ElementTree import iterparse
+
+"""
+Reads Tiled TMX maps and TSX tilesets into the dicts of Tiled's JSON
+export, so `TiledParser` takes either. Layer data is decoded into
+`array('I')` instead of lists of Python ints.
+"""
+
+""" Attribute conversions, anything else stays a string """
+INTS = {'id', 'x', 'y', 'width', 'height', 'tilewidth', 'tileheight', 'tilecount', 'columns', 'firstgid',
+        'tileid', 'duration', 'spacing', 'margin', 'nextlayerid', 'nextobjectid', 'compressionlevel'}
+FLOATS = {'x', 'y', 'width', 'height', 'rotation', 'opacity', 'offsetx', 'offsety', 'version'}
+BOOLS = {'visible', 'infinite'}
+
+
+def convert(name: str, value: str) -> object:
+    if name in BOOLS:
+        return value != '0'
+    if name in INTS or name in FLOATS:
+        number = float(value)
+        return int(number) if name in INTS and number.is_integer() else number
+    return value
+
+
+def convert_property(kind: str, value: str) -> object:
+    if kind == 'bool':
+        return value == 'true'
+    if kind == 'int':
+        return int(value)
+    if kind == 'float':
+        return float(value)
+    return value
+
+
+def decode_data(text: str, encoding: str, compression: str = None) -> array:
+    """ Gids of a `<data>` or `<chunk>` body as unsigned 32 bit integers """
+    if encoding == 'csv':
+        return array('I', [int(value) for value in text.replace('\n', '').split(',') if value])
+    if encoding != 'base64':
+        raise ValueError("Unsupported layer encoding %s." % encoding)
+    raw = base64.b64decode(text.strip())
+    if compression == 'zlib':
+        raw = zlib.decompress(raw)
+    elif compression == 'gzip':
+        raw = gzip.decompress(raw)
+    elif compression:
+        raise ValueError("Unsupported layer compression %s." % compression)
+    gids = array('I')
+    gids.frombytes(raw)
+    if sys.byteorder == 'big':
+        gids.byteswap()
+    return gids
+
+
+def attributes(element: object) -> dict:
+    return {name: convert(name, value) for name, value in element.attrib.items()}
+
+
+def read_tmx(filename: str) -> dict:
+    """
+    Streams the map with `iterparse`, each layer is decoded and its
+    elements released as soon as it ends.
+    """
+    result: dict = {}
+    stack: list = []
+    encoding = compression = None
+    for event, element in iterparse(filename, events=('start', 'end')):
+        tag = element.tag
+        if event == 'start':
+            if tag == 'map':
+                result = attributes(element)
+                result.update({'type': 'map', 'layers': [], 'tilesets': []})
+                stack.append(result)
+            elif tag == 'layer':
+                stack.append(dict({'visible': True, 'properties': []}, **attributes(element), type='tilelayer'))
+            elif tag == 'objectgroup':
+                stack.append(dict({'visible': True, 'properties': [], 'objects': []}, **attributes(element),
+                                  type='objectgroup'))
+            elif tag == 'object':
+                item = dict({'type': '', 'visible': True, 'width': 0, 'height': 0}, **attributes(element))
+                """ Tiled 1.9 renamed the object type to class """
+                item['type'] = item.pop('class', item['type'])
+                stack.append(item)
+            elif tag == 'tileset':
+                stack.append(attributes(element))
+            elif tag == 'tile':
+                stack.append(attributes(element))
+            elif tag == 'data':
+                encoding = element.get('encoding')
+                compression = element.get('compression')
+            continue
+        if tag == 'property':
+            stack[-1].setdefault('properties', []).append({
+                'name': element.get('name'),
+                'type': element.get('type', 'string'),
+                'value': convert_property(element.get('type', 'string'), element.get('value', element.text))
+            })
+        elif tag == 'chunk':
+            chunk = attributes(element)
+            chunk['data'] = decode_data(element.text or '', encoding, compression)
+            stack[-1].setdefault('chunks', []).append(chunk)
+            element.clear()
+        elif tag == 'data':
+            if 'chunks' in stack[-1]:
+                set_chunk_bounds(stack[-1])
+            else:
+                stack[-1]['data'] = decode_data(element.text or '', encoding, compression)
+            element.clear()
+        elif tag == 'image':
+            stack[-1].update({'image': element.get('source'), 'imagewidth': int(element.get('width', 0)),
+                              'imageheight': int(element.get('height', 0))})
+        elif tag == 'frame':
+            stack[-1].setdefault('animation', []).append(attributes(element))
+        elif tag == 'tile':
+            tile = stack.pop()
+            stack[-1].setdefault('tiles', []).append(tile)
+        elif tag == 'object':
+            item = stack.pop()
+            stack[-1]['objects'].append(item)
+        elif tag in ('layer', 'objectgroup'):
+            layer = stack.pop()
+            if stack[-1] is result:
+                result['layers'].append(layer)
+            else:
+                """ Collision shapes of a tile """
+                stack[-1]['objectgroup'] = layer
+            element.clear()
+        elif tag == 'tileset':
+            tileset = stack.pop()
+            if stack:
+                result['tilesets'].append(tileset)
+            else:
+                result = tileset
+    return result
+
+
+def read_tsx(filename: str) -> dict:
+    """ Tileset metadata: tile size and count, image and per tile animations and shapes """
+    tileset = read_tmx(filename)
+    tileset['type'] = 'tileset'
+    return tileset
+
+
+def set_chunk_bounds(layer: dict) -> None:
+    """ Layer extent in tiles, the JSON export stores it as startx/starty/width/height """
+    chunks = layer['chunks']
+    left = min(chunk['x'] for chunk in chunks)
+    top = min(chunk['y'] for chunk in chunks)
+    layer['startx'] = left
+    layer['starty'] = top
+    layer['width'] = max(chunk['x'] + chunk['width'] for chunk in chunks) - left
+    layer['height'] = max(chunk['y'] + chunk['height'] for chunk in chunks) - top